@@ -1,5 +1,5 @@
 # app.py
-from flask import Flask, render_template
+from flask import Flask, render_template, url_for
 from extensions import mongo, login_manager
 from config import Config
 import os
@@ -10,12 +10,21 @@ def create_app():
     app.config.from_object(Config)
     
     # Initialize extensions with app
-    mongo.init_app(app)
+    mongo.init_app(
+        app,
+        maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+        waitQueueTimeoutMS=app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS']
+    )
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
     
+    if app.config.get('MONGO_ENSURE_INDEXES'):
+        from models.indexes import ensure_indexes
+        ensure_indexes()
+    
     # User loader function - import User here to avoid circular imports
     @login_manager.user_loader
     def load_user(user_id):
@@ -31,6 +40,9 @@ def create_app():
     from routes.user_dashboard import user_dashboard_bp
     from routes.org_dashboard import org_dashboard_bp
     from routes.admin import admin_bp
+    from routes.image import image_bp
+    from routes.search import search_bp
+    from routes.assets import assets_bp
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -41,6 +53,33 @@ def create_app():
     app.register_blueprint(user_dashboard_bp, url_prefix='/dashboard')
     app.register_blueprint(org_dashboard_bp, url_prefix='/org-dashboard')
     app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(image_bp, url_prefix='/images')
+    app.register_blueprint(search_bp, url_prefix='/search')
+    app.register_blueprint(assets_bp, url_prefix='/assets')
+    
+    # CLI commands (flask db ...)
+    from commands import db_cli, webhooks_cli, assets_cli, compression_cli
+    app.cli.add_command(db_cli)
+    app.cli.add_command(webhooks_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(compression_cli)
+    
+    # Fingerprinted static assets; a read-only deploy serves the prebuilt manifest
+    from utils.assets import build_assets, load_manifest, static_url
+    if app.config.get('STATIC_BUILD_ON_STARTUP'):
+        try:
+            build_assets(app)
+        except OSError as e:
+            app.logger.warning(f"Static asset build failed, using the existing manifest: {e}")
+            load_manifest(app)
+    else:
+        load_manifest(app)
+    app.add_template_global(static_url, 'static_url')
+    
+    # Search suggestions are served from memory; build them before the first request
+    if app.config.get('TYPEAHEAD_BUILD_ON_STARTUP'):
+        from utils.typeahead import build_index
+        build_index(app)
     
     # Create upload directory if it doesn't exist
     upload_folder = app.config.get('UPLOAD_FOLDER', 'static/uploads')
@@ -90,13 +129,19 @@ def create_app():
             return text
         return text[:length] + '...'
     
-    # Before request handlers
-    @app.before_request
-    def before_request():
-        """Executed before each request"""
-        # You can add global before-request logic here
-        # For example: check if user is banned, log requests, etc.
-        pass
+    @app.template_global('image_url')
+    def image_url(image_ref, width=None):
+        """URL for a stored image id, at the smallest Image.SIZES width covering the slot"""
+        if not image_ref:
+            return ''
+        image_ref = str(image_ref)
+        # Values not yet rewritten by `flask db migrate-images` are already URLs
+        if image_ref.startswith(('data:', 'http://', 'https://', '/')):
+            return image_ref
+        if width is not None:
+            from models.image import Image
+            width = next((size for size in Image.SIZES if size >= width), None)
+        return url_for('image.serve', image_id=image_ref, width=width)
     
     # After request handlers
     @app.after_request
@@ -106,7 +151,18 @@ def create_app():
         response.headers['X-Content-Type-Options'] = 'nosniff'
         response.headers['X-Frame-Options'] = 'DENY'
         response.headers['X-XSS-Protection'] = '1; mode=block'
-        return response
+        
+        # Report how many model lookups the identity map saved this request
+        if app.debug:
+            from models import identity_map
+            stats = identity_map.stats()
+            if stats['hits'] or stats['misses']:
+                response.headers['X-Identity-Map'] = f"hits={stats['hits']}; misses={stats['misses']}"
+                app.logger.debug(f"Identity map: {stats['hits']} hit(s), {stats['misses']} miss(es)")
+        
+        # Last, so the headers above are already set on the encoded response
+        from utils.compression import compress_response
+        return compress_response(response)
     
     return app
 
@@ -0,0 +1,330 @@
+# commands.py
+import click
+import time
+from datetime import datetime
+from flask.cli import AppGroup
+from extensions import mongo
+
+db_cli = AppGroup('db', help='Database maintenance commands.')
+webhooks_cli = AppGroup('webhooks', help='Webhook outbox commands.')
+assets_cli = AppGroup('assets', help='Static asset commands.')
+compression_cli = AppGroup('compression', help='Response compression commands.')
+
+# (collection, field, image category, field holding the uploader's user id)
+IMAGE_FIELDS = [
+    ('users', 'profile_image', 'profile', '_id'),
+    ('organisations', 'logo_image', 'organisation_logo', 'user_id'),
+    ('organisations', 'banner_image', 'organisation_banner', 'user_id'),
+]
+
+@db_cli.command('ensure-indexes')
+def ensure_indexes():
+    """Create the indexes declared on the models"""
+    from models.indexes import ensure_indexes
+    
+    for collection, names in ensure_indexes().items():
+        click.echo(f"{collection}: {', '.join(names)}")
+
+@db_cli.command('rebuild-stats')
+def rebuild_stats():
+    """Recompute the platform_stats counters from the source collections"""
+    from models.platform_stats import PlatformStats
+    
+    stats = PlatformStats.rebuild()
+    for key in PlatformStats.COUNTERS:
+        click.echo(f"{key}: {stats[key]}")
+
+@db_cli.command('rebuild-rollups')
+@click.option('--workers', default=4, show_default=True, help='Months rebuilt in parallel.')
+def rebuild_rollups(workers):
+    """Recompute donation_rollups_monthly from the donations, one month per task"""
+    from concurrent.futures import ThreadPoolExecutor
+    from flask import current_app
+    from models.donation_rollup import DonationRollup
+    
+    app = current_app._get_current_object()
+    
+    def rebuild(month):
+        with app.app_context():
+            return month, DonationRollup.rebuild_month(month)
+    
+    months = DonationRollup.months()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for month, rows in executor.map(rebuild, months):
+            click.echo(f"{month:%Y-%m}: {rows} rows")
+    click.echo(f"Rebuilt {len(months)} months")
+
+@db_cli.command('rebuild-summaries')
+def rebuild_summaries():
+    """Recompute every donor and organisation donation summary"""
+    from models.donation_summary import DonationSummary
+    
+    for kind in DonationSummary.KINDS:
+        click.echo(f"{kind}: {DonationSummary.rebuild_all(kind)} summaries")
+
+@db_cli.command('finish-completions')
+def finish_completions():
+    """Apply counters that completed donations still owe after an interrupted request"""
+    from models.donation import Donation
+    
+    stalled = mongo.db.donations.find(
+        {'pending_counters.0': {'$exists': True}, 'counters_leased_until': {'$lt': datetime.utcnow()}},
+        {'_id': 1}
+    )
+    finished = 0
+    for donation_data in stalled:
+        donation = Donation.get_by_id(donation_data['_id'])
+        if donation and donation.finish_counters():
+            finished += 1
+    click.echo(f"Finished {finished} donation(s)")
+
+@db_cli.command('migrate-images')
+def migrate_images():
+    """Move inline data-URL and base64 images into GridFS"""
+    from models.image import Image
+    
+    # Earlier uploads kept their bytes base64-encoded on the image document.
+    # Address them first so the data-URL fields below reuse them via acquire()
+    moved = 0
+    for doc in mongo.db.images.find({'data': {'$exists': True}}, {'data': 0}):
+        image = Image.__new__(Image)
+        image.__dict__.update(doc)
+        image.move_to_gridfs()
+        moved += 1
+    click.echo(f"images: moved {moved} inline image(s) to GridFS")
+    
+    # Those documents predate reference counting. The fields only ever held
+    # data-URL copies, so count whatever really points at each one (usually 0)
+    initialised = 0
+    for doc in mongo.db.images.find({'ref_count': {'$exists': False}}, {'_id': 1}):
+        references = sum(
+            mongo.db[collection].count_documents({field: doc['_id']})
+            for collection, field, _, _ in IMAGE_FIELDS
+        )
+        mongo.db.images.update_one(
+            {'_id': doc['_id'], 'ref_count': {'$exists': False}},
+            {'$set': {'ref_count': references}}
+        )
+        initialised += 1
+    click.echo(f"images: initialised reference counts on {initialised} image(s)")
+    
+    for collection, field, category, uploader_field in IMAGE_FIELDS:
+        migrated = 0
+        cursor = mongo.db[collection].find(
+            {field: {'$regex': '^data:'}},
+            {field: 1, uploader_field: 1}
+        )
+        for doc in cursor:
+            image = Image.create_from_data_url(
+                doc[field],
+                doc.get(uploader_field) or doc['_id'],
+                category=category
+            )
+            if not image:
+                click.echo(f"Skipping {collection}.{field} on {doc['_id']}: not a base64 data URL")
+                continue
+            
+            mongo.db[collection].update_one(
+                {'_id': doc['_id']},
+                {'$set': {field: image._id}}
+            )
+            migrated += 1
+        
+        click.echo(f"{collection}.{field}: migrated {migrated} image(s)")
+
+@db_cli.command('generate-image-variants')
+def generate_image_variants():
+    """Render thumbnails and WebP copies for images that are missing them"""
+    from utils.image_pipeline import generate_variants
+    
+    generated = 0
+    cursor = mongo.db.images.find(
+        {'file_id': {'$exists': True}, 'variants': {'$in': [None, {}]}},
+        {'_id': 1}
+    )
+    for doc in cursor:
+        if generate_variants(doc['_id']):
+            generated += 1
+    click.echo(f"images: generated variants for {generated} image(s)")
+
+BSON_MAX_SIZE = 16 * 1024 * 1024
+
+def _measure(fn, rounds):
+    """Mean wall-clock seconds and peak traced allocation (bytes) of fn() over rounds"""
+    import tracemalloc
+    
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    elapsed = (time.perf_counter() - started) / rounds
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+@db_cli.command('benchmark-image-upload')
+@click.option('--size-mb', default=16, show_default=True, help='Size of the test upload.')
+@click.option('--rounds', default=5, show_default=True, help='Uploads timed per path.')
+def benchmark_image_upload(size_mb, rounds):
+    """Compare peak memory and throughput of GridFS streaming against read + base64"""
+    import base64
+    import os
+    import tempfile
+    from models.image import store_stream, get_bucket
+    
+    size = size_mb * 1024 * 1024
+    # The base64 path stores the upload inline, so it only works while the
+    # encoded bytes fit one BSON document (16 MiB, less room for the other fields)
+    base64_fits = (size + 2) // 3 * 4 <= BSON_MAX_SIZE - 1024
+    file_ids = []
+    scratch = mongo.db.image_upload_benchmark
+    
+    with tempfile.TemporaryFile() as upload:
+        upload.write(os.urandom(size))
+        
+        def base64_path():
+            # What create_from_file did before: whole upload in memory, encoded inline
+            upload.seek(0)
+            encoded = base64.b64encode(upload.read()).decode('utf-8')
+            scratch.insert_one({'filename': 'benchmark', 'data': encoded})
+        
+        def gridfs_path():
+            upload.seek(0)
+            file_ids.append(store_stream(upload, 'benchmark', 'application/octet-stream')[0])
+        
+        try:
+            for name, path in (('read + base64', base64_path), ('gridfs stream', gridfs_path)):
+                if path is base64_path and not base64_fits:
+                    click.echo(f"{name:<14} not possible: {size_mb} MiB base64-encodes past the "
+                               f"{BSON_MAX_SIZE // 1024 // 1024} MiB BSON document limit")
+                    continue
+                elapsed, peak = _measure(path, rounds)
+                click.echo(f"{name:<14} {size / elapsed / 1024 / 1024:8.1f} MiB/s  "
+                           f"peak {peak / 1024 / 1024:7.2f} MiB")
+        finally:
+            scratch.drop()
+            bucket = get_bucket()
+            for file_id in file_ids:
+                bucket.delete(file_id)
+
+@db_cli.command('benchmark-user-loader')
+@click.option('--user-id', default=None, help='User to sign in as (defaults to the first user).')
+@click.option('--path', default='/', show_default=True, help='Page requested while signed in.')
+@click.option('--requests', 'count', default=200, show_default=True, help='Requests timed per loader.')
+def benchmark_user_loader(user_id, path, count):
+    """Compare authenticated request latency across user loader strategies"""
+    from flask import current_app
+    from pymongo import MongoClient
+    from bson.objectid import ObjectId
+    from extensions import login_manager
+    from models.user import User, _user_cache
+    
+    if user_id is None:
+        user_data = mongo.db.users.find_one({}, {'_id': 1})
+        if user_data is None:
+            raise click.ClickException("No users to sign in as")
+        user_id = str(user_data['_id'])
+    
+    app = current_app._get_current_object()
+    
+    def build(user_data):
+        if not user_data:
+            return None
+        user = User.__new__(User)
+        user.__dict__.update(user_data)
+        return user
+    
+    def client_per_request(user_id):
+        # What load_user did before: a fresh client (and pool) on every request
+        client = MongoClient(app.config['MONGO_URI'])
+        try:
+            user_data = client.get_default_database().users.find_one({'_id': ObjectId(user_id)})
+        finally:
+            client.close()
+        return build(user_data)
+    
+    def shared_client(user_id):
+        user_data = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+        return build(user_data)
+    
+    original = login_manager._user_callback
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = user_id
+        session['_fresh'] = True
+    
+    try:
+        for name, loader in (('client per request', client_per_request),
+                             ('shared client', shared_client),
+                             ('shared client + cache', User.get_by_id)):
+            login_manager.user_loader(loader)
+            _user_cache.clear()
+            client.get(path)  # warm up pools and the cache
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                client.get(path)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            click.echo(f"{name:<22} mean {sum(timings) / len(timings):7.2f} ms  "
+                       f"p50 {timings[len(timings) // 2]:7.2f} ms  p95 {timings[int(len(timings) * 0.95)]:7.2f} ms")
+    finally:
+        login_manager.user_loader(original)
+
+@webhooks_cli.command('dispatch')
+@click.option('--workers', type=int, default=None, help='Delivery threads (defaults to WEBHOOK_DISPATCHER_WORKERS).')
+@click.option('--url', default=None, help='Deliver to this URL instead of N8N_WEBHOOK_URL, e.g. a local n8n stand-in.')
+def dispatch(workers, url):
+    """Run the outbox dispatcher in the foreground"""
+    from flask import current_app
+    from utils.webhook_dispatcher import WebhookDispatcher
+    
+    dispatcher = WebhookDispatcher(current_app._get_current_object(), url=url, workers=workers).start()
+    click.echo(f"Dispatching webhooks to {dispatcher.url} with {dispatcher.workers} worker(s)")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        dispatcher.stop()
+
+@webhooks_cli.command('retry-dead')
+@click.option('--event-type', default=None, help='Only requeue this event type.')
+def retry_dead(event_type):
+    """Requeue dead-lettered events"""
+    query = {'status': 'dead'}
+    if event_type:
+        query['event_type'] = event_type
+    result = mongo.db.webhook_outbox.update_many(
+        query,
+        {'$set': {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()}}
+    )
+    click.echo(f"Requeued {result.modified_count} event(s)")
+
+@assets_cli.command('build')
+def build():
+    """Minify, fingerprint and precompress static/css and static/js into static/dist"""
+    from flask import current_app
+    from utils.assets import build_assets
+    
+    manifest = build_assets(current_app._get_current_object())
+    for source, hashed in manifest.items():
+        click.echo(f"{source} -> {hashed}")
+    click.echo(f"Built {len(manifest)} asset(s)")
+
+@compression_cli.command('benchmark')
+@click.argument('paths', nargs=-1)
+@click.option('--rounds', default=20, show_default=True, help='Compressions timed per level.')
+def benchmark_compression(paths, rounds):
+    """Compare CPU cost and bytes saved per compression level on rendered pages"""
+    from flask import current_app
+    from utils.compression import benchmark
+    
+    client = current_app.test_client()
+    for path in paths or ('/', '/campaigns/', '/organisations/', '/search/?q=water'):
+        # Ask for the plain body so it is measured before any compression
+        response = client.get(path, headers={'Accept-Encoding': 'identity'})
+        body = response.get_data()
+        click.echo(f"{path} ({response.status_code}, {response.mimetype}): {len(body)} bytes")
+        for row in benchmark(body, rounds=rounds):
+            click.echo(f"  {row['encoding']:<4} {row['level']:>2}  {row['size']:>8} bytes  "
+                       f"{row['saved']:6.1%} saved  {row['ms']:7.3f} ms")
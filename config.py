@@ -9,3 +9,65 @@ class Config:
     N8N_WEBHOOK_URL = os.environ.get('N8N_WEBHOOK_URL')
     UPLOAD_FOLDER = 'static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    # Connection pool of the shared client in extensions.mongo
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    # Apply donation completion counters in a multi-document transaction.
+    # Unset: used whenever the deployment supports them (replica set or
+    # mongos); standalone servers fall back to ordered writes tracked on the
+    # donation. '1' / '0' force either path.
+    MONGO_TRANSACTIONS = {'1': True, '0': False}.get(os.environ.get('MONGO_TRANSACTIONS'))
+    COMPLETION_LEASE = 60  # seconds before a stalled completion's counters may be finished by another request
+    # Seconds a loaded user document is reused across requests. Each hit is
+    # checked against the stored version (one _id lookup returning one field),
+    # so edits through User.update are never served stale; only writes that
+    # bypass it and leave version alone can be up to this many seconds old.
+    USER_CACHE_TTL = 30
+    SEARCH_CACHE_TTL = 60  # seconds a search result page is reused
+    # Rendered fragments (utils/fragment_cache.py): fresh for TTL seconds,
+    # then served stale for up to STALE more while one thread re-renders
+    FRAGMENT_CACHE_TTL = 60
+    FRAGMENT_CACHE_STALE = 600
+    TYPEAHEAD_REFRESH = 300  # seconds before a worker rebuilds its suggestion index
+    # Build the suggestion index in create_app (forked workers inherit it);
+    # otherwise each worker builds it on its first suggestion request
+    TYPEAHEAD_BUILD_ON_STARTUP = os.environ.get('TYPEAHEAD_BUILD_ON_STARTUP', '1') == '1'
+    # Build static/dist (minified, hashed, precompressed) in create_app;
+    # otherwise run `flask assets build` and ship the manifest
+    STATIC_BUILD_ON_STARTUP = os.environ.get('STATIC_BUILD_ON_STARTUP', '1') == '1'
+    # Dynamic response compression (utils/compression.py): bodies under
+    # COMPRESS_MIN_SIZE bytes or of other types are sent as they are
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip, 1-9
+    COMPRESS_BR_QUALITY = int(os.environ.get('COMPRESS_BR_QUALITY', 4))  # brotli, 0-11
+    COMPRESS_MIMETYPES = (
+        'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+        'application/javascript', 'application/json', 'application/x-ndjson',
+        'application/xml', 'image/svg+xml',
+    )
+    EXPORT_BATCH_SIZE = 2000  # documents per cursor batch in admin exports
+    # Create model indexes in create_app; otherwise run `flask db ensure-indexes`
+    MONGO_ENSURE_INDEXES = os.environ.get('MONGO_ENSURE_INDEXES', '0') == '1'
+    IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 2))
+    IMAGE_VARIANT_QUEUE = 32  # uploads waiting for thumbnails before new ones are skipped
+    
+    # Webhook outbox dispatcher (utils/webhook_dispatcher.py). Deliveries are
+    # made by a dedicated `flask webhooks dispatch` worker; enabling this also
+    # starts a poller inside each web process that queues an event (handy for
+    # single-process development, wasteful with many workers).
+    WEBHOOK_DISPATCHER_ENABLED = os.environ.get('WEBHOOK_DISPATCHER_ENABLED', '0') == '1'
+    WEBHOOK_DISPATCHER_WORKERS = 2
+    WEBHOOK_TIMEOUT = 10  # seconds per POST
+    WEBHOOK_MAX_ATTEMPTS = 8  # then the event is dead-lettered
+    WEBHOOK_BACKOFF_BASE = 2  # seconds; doubles on every failed attempt
+    WEBHOOK_BACKOFF_MAX = 3600
+    WEBHOOK_POLL_INTERVAL = 1.0  # seconds between polls of an idle outbox
+    
+    # Event types delivered in gzip-compressed batches rather than one POST
+    # each. A batch is flushed at max_size events or after max_latency seconds.
+    WEBHOOK_BATCHING = {
+        'donation_completed': {'max_size': 100, 'max_latency': 5.0},
+        'user_login': {'max_size': 200, 'max_latency': 10.0},
+    }
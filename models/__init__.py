@@ -8,11 +8,17 @@ from .organisation import Organisation
 from .campaign import Campaign
 from .donation import Donation
 from .image import Image
+from .platform_stats import PlatformStats
+from .donation_rollup import DonationRollup
+from .donation_summary import DonationSummary
 
 __all__ = [
     'User',
     'Organisation', 
     'Campaign',
     'Donation',
-    'Image'
+    'Image',
+    'PlatformStats',
+    'DonationRollup',
+    'DonationSummary'
 ]
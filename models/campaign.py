@@ -1,8 +1,48 @@
 from bson.objectid import ObjectId
 from extensions import mongo
+from utils.helpers import resolve_projection
+from utils.cache import TTLCache
+from utils.typeahead import index_campaign
+from utils.fragment_cache import invalidate_fragments
+from models import identity_map
+from models.platform_stats import PlatformStats
 from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+# Category filters match case-insensitively ('education' == 'Education')
+CATEGORY_COLLATION = {'locale': 'en', 'strength': 2}
+
+# Raw result pages of recent searches, keyed by (query, category, page, per_page)
+_search_cache = TTLCache(maxsize=256)
 
 class Campaign:
+    INDEXES = [
+        IndexModel([('organisation_id', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('is_active', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel(
+            [('is_active', ASCENDING), ('category', ASCENDING), ('created_at', DESCENDING)],
+            collation=CATEGORY_COLLATION
+        ),
+        IndexModel([('raised_amount', DESCENDING)]),
+        IndexModel([('created_at', DESCENDING)]),
+        IndexModel(
+            [('title', TEXT), ('description', TEXT), ('category', TEXT)],
+            weights={'title': 10, 'category': 5, 'description': 1},
+            name='campaign_text'
+        ),
+    ]
+    
+    # Named field sets for list views; 'detail' loads the whole document
+    PROJECTIONS = {
+        'card': ('title', 'description', 'category', 'banner_image', 'goal_amount', 'raised_amount',
+                 'organisation_id', 'created_at', 'end_date', 'is_active'),
+        'row': ('title', 'category', 'banner_image', 'goal_amount', 'raised_amount',
+                'organisation_id', 'created_at', 'is_active'),
+        # Just what a conditional GET needs to build its validator
+        'validator': ('version', 'updated_at', 'created_at', 'organisation_id'),
+        'detail': None,
+    }
+    
     def __init__(self, title, description, goal_amount, organisation_id, **kwargs):
         self.title = title
         self.description = description
@@ -26,42 +66,196 @@ class Campaign:
             'is_active': self.is_active,
             'end_date': self.end_date,
             'banner_image': self.banner_image,
-            'category': self.category
+            'category': self.category,
+            'version': 1,
+            'updated_at': self.created_at
         }
         result = mongo.db.campaigns.insert_one(campaign_data)
         self._id = result.inserted_id
+        PlatformStats.increment(campaigns=1, active_campaigns=int(bool(self.is_active)))
+        # The organisation's page lists its campaigns
+        from models.organisation import Organisation
+        Organisation.touch(self.organisation_id)
+        index_campaign(self)
+        invalidate_fragments('campaigns')
         return self
     
     @staticmethod
-    def get_by_id(campaign_id):
+    def get_by_id(campaign_id, projection=None):
+        """Load by id, at most once per request (see models.identity_map)"""
         try:
-            campaign_data = mongo.db.campaigns.find_one({'_id': ObjectId(campaign_id)})
-            if campaign_data:
+            _id = ObjectId(campaign_id)
+        except:
+            return None
+        
+        campaign = identity_map.lookup('campaigns', _id, projection)
+        if campaign is not identity_map.MISSING:
+            return campaign
+        
+        campaign = None
+        campaign_data = mongo.db.campaigns.find_one(
+            {'_id': _id},
+            resolve_projection(Campaign.PROJECTIONS, projection)
+        )
+        if campaign_data:
+            campaign = Campaign.__new__(Campaign)
+            campaign.__dict__.update(campaign_data)
+        return identity_map.store('campaigns', _id, projection, campaign)
+    
+    @staticmethod
+    def get_many(campaign_ids, projection=None, as_dict=False):
+        """Load several campaigns with one $in query.
+        
+        Returns them in the order requested (unknown ids are skipped), or a
+        dict keyed by ObjectId when as_dict is set. Ids already loaded this
+        request come from the identity map.
+        """
+        ids = []
+        for campaign_id in campaign_ids:
+            try:
+                ids.append(ObjectId(campaign_id))
+            except:
+                pass
+        ids = list(dict.fromkeys(ids))
+        
+        found = {}
+        for _id in ids:
+            campaign = identity_map.lookup('campaigns', _id, projection)
+            if campaign is not identity_map.MISSING:
+                found[_id] = campaign
+        
+        missing = [_id for _id in ids if _id not in found]
+        if missing:
+            cursor = mongo.db.campaigns.find(
+                {'_id': {'$in': missing}},
+                resolve_projection(Campaign.PROJECTIONS, projection)
+            )
+            for campaign_data in cursor:
                 campaign = Campaign.__new__(Campaign)
                 campaign.__dict__.update(campaign_data)
-                return campaign
-        except:
-            pass
-        return None
+                found[campaign._id] = campaign
+            for _id in missing:
+                identity_map.store('campaigns', _id, projection, found.get(_id))
+        
+        if as_dict:
+            return {_id: found[_id] for _id in ids if found.get(_id)}
+        return [found[_id] for _id in ids if found.get(_id)]
+    
+    @staticmethod
+    def get_by_organisation_id(org_id, projection=None):
+        campaigns = []
+        projection = resolve_projection(Campaign.PROJECTIONS, projection)
+        for campaign_data in mongo.db.campaigns.find({'organisation_id': ObjectId(org_id)}, projection):
+            campaign = Campaign.__new__(Campaign)
+            campaign.__dict__.update(campaign_data)
+            campaigns.append(campaign)
+        return campaigns
     
     @staticmethod
-    def get_by_organisation_id(org_id):
+    def get_all_active(projection=None):
         campaigns = []
-        for campaign_data in mongo.db.campaigns.find({'organisation_id': ObjectId(org_id)}):
+        projection = resolve_projection(Campaign.PROJECTIONS, projection)
+        for campaign_data in mongo.db.campaigns.find({'is_active': True}, projection):
             campaign = Campaign.__new__(Campaign)
             campaign.__dict__.update(campaign_data)
             campaigns.append(campaign)
         return campaigns
     
     @staticmethod
-    def get_all_active():
+    def get_top_by_raised(limit=10, projection='row'):
+        """Campaigns that have raised the most, highest first"""
         campaigns = []
-        for campaign_data in mongo.db.campaigns.find({'is_active': True}):
+        projection = resolve_projection(Campaign.PROJECTIONS, projection)
+        for campaign_data in mongo.db.campaigns.find({}, projection).sort('raised_amount', DESCENDING).limit(limit):
             campaign = Campaign.__new__(Campaign)
             campaign.__dict__.update(campaign_data)
             campaigns.append(campaign)
         return campaigns
     
+    @staticmethod
+    def get_active_page(category=None, page=1, per_page=12, projection='card'):
+        """One page of active campaigns, newest first.
+        
+        Returns (campaigns, has_next); fetches per_page + 1 documents to tell
+        whether another page exists.
+        """
+        query = {'is_active': True}
+        options = {}
+        if category and category != 'all':
+            query['category'] = category
+            options['collation'] = CATEGORY_COLLATION
+        
+        projection = resolve_projection(Campaign.PROJECTIONS, projection)
+        cursor = mongo.db.campaigns.find(query, projection, **options) \
+            .sort('created_at', DESCENDING) \
+            .skip((max(page, 1) - 1) * per_page) \
+            .limit(per_page + 1)
+        
+        campaigns = []
+        for campaign_data in cursor:
+            campaign = Campaign.__new__(Campaign)
+            campaign.__dict__.update(campaign_data)
+            campaigns.append(campaign)
+        return campaigns[:per_page], len(campaigns) > per_page
+    
+    @staticmethod
+    def search(text, category=None, page=1, per_page=12, projection='card'):
+        """Relevance-ranked page of active campaigns matching text.
+        
+        Returns (campaigns, total, categories), where categories is
+        [{'_id': category, 'count': n}] over every match regardless of the
+        category filter. One $facet aggregation over the text index produces
+        all three; pages are cached for SEARCH_CACHE_TTL seconds.
+        """
+        from flask import current_app
+        
+        category = category if category and category != 'all' else None
+        key = (text.strip().lower(), category, page, per_page, projection)
+        result = _search_cache.get(key, None)
+        if result is None:
+            results = [{'$sort': {'score': {'$meta': 'textScore'}, '_id': 1}},
+                       {'$skip': (max(page, 1) - 1) * per_page},
+                       {'$limit': per_page}]
+            fields = resolve_projection(Campaign.PROJECTIONS, projection)
+            if fields:
+                results.append({'$project': fields})
+            matched = [{'$match': {'category': category}}] if category else []
+            
+            facets = list(mongo.db.campaigns.aggregate([
+                {'$match': {'$text': {'$search': text}, 'is_active': True}},
+                {'$facet': {
+                    'results': matched + results,
+                    'total': matched + [{'$count': 'count'}],
+                    'categories': [
+                        {'$group': {'_id': '$category', 'count': {'$sum': 1}}},
+                        {'$sort': {'count': -1, '_id': 1}}
+                    ]
+                }}
+            ]))[0]
+            result = (
+                facets['results'],
+                facets['total'][0]['count'] if facets['total'] else 0,
+                facets['categories']
+            )
+            _search_cache.set(key, result, current_app.config.get('SEARCH_CACHE_TTL', 60))
+        
+        docs, total, categories = result
+        campaigns = []
+        for campaign_data in docs:
+            campaign = Campaign.__new__(Campaign)
+            campaign.__dict__.update(campaign_data)
+            campaigns.append(campaign)
+        return campaigns, total, categories
+    
+    @staticmethod
+    def count_by_organisation_ids(org_ids):
+        """Number of campaigns per organisation, from one grouped query"""
+        counts = mongo.db.campaigns.aggregate([
+            {'$match': {'organisation_id': {'$in': [ObjectId(org_id) for org_id in org_ids]}}},
+            {'$group': {'_id': '$organisation_id', 'count': {'$sum': 1}}}
+        ])
+        return {row['_id']: row['count'] for row in counts}
+    
     def update(self, **kwargs):
         update_data = {}
         for key, value in kwargs.items():
@@ -70,10 +264,20 @@ class Campaign:
                 update_data[key] = value
         
         if update_data:
-            mongo.db.campaigns.update_one(
+            previous = mongo.db.campaigns.find_one_and_update(
                 {'_id': self._id},
-                {'$set': update_data}
+                {'$set': dict(update_data, updated_at=datetime.utcnow()), '$inc': {'version': 1}},
+                projection={'is_active': 1}
             )
+            identity_map.invalidate('campaigns', self._id)
+            from models.organisation import Organisation
+            Organisation.touch(self.organisation_id)
+            if previous and 'is_active' in update_data:
+                PlatformStats.increment(active_campaigns=(
+                    int(bool(update_data['is_active'])) - int(bool(previous.get('is_active')))
+                ))
+            index_campaign(self)
+            invalidate_fragments('campaigns')
         return self
     
     def get_organisation(self):
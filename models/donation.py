@@ -1,8 +1,53 @@
 from bson.objectid import ObjectId
+from flask import current_app
 from extensions import mongo
-from datetime import datetime
+from utils.helpers import keyset_paginate, resolve_projection, transactions_supported
+from models import identity_map
+from models.platform_stats import PlatformStats
+from models.donation_rollup import DonationRollup
+from models.donation_summary import DonationSummary
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
 
 class Donation:
+    INDEXES = [
+        IndexModel([('donor_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('organisation_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('payment_status', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('created_at', DESCENDING)]),
+        # Only completions still owing counters carry a lease, for finish-completions
+        IndexModel([('counters_leased_until', ASCENDING)],
+                   partialFilterExpression={'counters_leased_until': {'$exists': True}}),
+    ]
+    
+    # Named field sets for list views; 'detail' loads the whole document
+    PROJECTIONS = {
+        'row': ('amount', 'donor_id', 'campaign_id', 'organisation_id', 'created_at',
+                'payment_status', 'receipt_id', 'is_anonymous'),
+        'detail': None,
+    }
+    
+    # Counter writes a completion owes, in the order they are applied
+    COUNTER_STEPS = ('campaign', 'organisation', 'platform', 'rollup', 'summary')
+    
+    # Joined onto history pages: just what a history row shows of each
+    HISTORY_JOIN = [
+        {'$lookup': {
+            'from': 'campaigns',
+            'localField': 'campaign_id',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'title': 1, 'banner_image': 1}}],
+            'as': 'campaign'
+        }},
+        {'$lookup': {
+            'from': 'organisations',
+            'localField': 'organisation_id',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'name': 1, 'logo_image': 1}}],
+            'as': 'organisation'
+        }},
+    ]
+    
     def __init__(self, amount, donor_id, campaign_id, organisation_id, **kwargs):
         self.amount = float(amount)
         self.donor_id = ObjectId(donor_id)
@@ -32,6 +77,12 @@ class Donation:
         self._id = result.inserted_id
         return self
     
+    @staticmethod
+    def from_data(donation_data):
+        donation = Donation.__new__(Donation)
+        donation.__dict__.update(donation_data)
+        return donation
+    
     @staticmethod
     def get_by_id(donation_id):
         try:
@@ -45,42 +96,216 @@ class Donation:
         return None
     
     @staticmethod
-    def get_by_donor_id(donor_id):
+    def get_many(donation_ids, projection=None):
+        """Load several donations with one $in query, in the order requested"""
+        ids = [ObjectId(donation_id) for donation_id in donation_ids]
+        found = {}
+        for donation_data in mongo.db.donations.find(
+            {'_id': {'$in': ids}},
+            resolve_projection(Donation.PROJECTIONS, projection)
+        ):
+            found[donation_data['_id']] = Donation.from_data(donation_data)
+        return [found[_id] for _id in ids if _id in found]
+    
+    @staticmethod
+    def get_by_donor_id(donor_id, projection=None):
         donations = []
-        for donation_data in mongo.db.donations.find({'donor_id': ObjectId(donor_id)}):
+        projection = resolve_projection(Donation.PROJECTIONS, projection)
+        for donation_data in mongo.db.donations.find({'donor_id': ObjectId(donor_id)}, projection):
             donation = Donation.__new__(Donation)
             donation.__dict__.update(donation_data)
             donations.append(donation)
         return donations
     
     @staticmethod
-    def get_by_organisation_id(org_id):
+    def get_by_organisation_id(org_id, projection=None):
         donations = []
-        for donation_data in mongo.db.donations.find({'organisation_id': ObjectId(org_id)}):
+        projection = resolve_projection(Donation.PROJECTIONS, projection)
+        for donation_data in mongo.db.donations.find({'organisation_id': ObjectId(org_id)}, projection):
             donation = Donation.__new__(Donation)
             donation.__dict__.update(donation_data)
             donations.append(donation)
         return donations
     
+    @staticmethod
+    def get_recent(limit=10, projection='row'):
+        """Newest donations first, whatever their status"""
+        projection = resolve_projection(Donation.PROJECTIONS, projection)
+        cursor = mongo.db.donations.find({}, projection).sort('created_at', DESCENDING).limit(limit)
+        return [Donation.from_data(donation_data) for donation_data in cursor]
+    
+    @staticmethod
+    def from_history(donation_data):
+        """Split a joined history document into donation, campaign and organisation"""
+        from models.campaign import Campaign
+        from models.organisation import Organisation
+        
+        campaigns = donation_data.pop('campaign', [])
+        organisations = donation_data.pop('organisation', [])
+        campaign = organisation = None
+        if campaigns:
+            campaign = Campaign.__new__(Campaign)
+            campaign.__dict__.update(campaigns[0])
+        if organisations:
+            organisation = Organisation.__new__(Organisation)
+            organisation.__dict__.update(organisations[0])
+        return {
+            'donation': Donation.from_data(donation_data),
+            'campaign': campaign,
+            'organisation': organisation
+        }
+    
+    @staticmethod
+    def history_by_donor_id(donor_id, cursor=None, per_page=10, projection='row'):
+        """Keyset page of a donor's donations, newest first, joined in one aggregation"""
+        return keyset_paginate(
+            mongo.db.donations,
+            {'donor_id': ObjectId(donor_id)},
+            cursor,
+            per_page,
+            projection=resolve_projection(Donation.PROJECTIONS, projection),
+            wrap=Donation.from_history,
+            join=Donation.HISTORY_JOIN
+        )
+    
+    @staticmethod
+    def history_by_organisation_id(org_id, cursor=None, per_page=15, projection='row'):
+        """Keyset page of an organisation's donations, newest first, joined in one aggregation"""
+        return keyset_paginate(
+            mongo.db.donations,
+            {'organisation_id': ObjectId(org_id)},
+            cursor,
+            per_page,
+            projection=resolve_projection(Donation.PROJECTIONS, projection),
+            wrap=Donation.from_history,
+            join=Donation.HISTORY_JOIN[:1]
+        )
+    
     def update_status(self, status):
+        if status == 'completed':
+            self.complete()
+            return self
+        
         self.payment_status = status
         mongo.db.donations.update_one(
             {'_id': self._id},
             {'$set': {'payment_status': status}}
         )
+        return self
+    
+    def complete(self):
+        """Flip pending -> completed and apply every counter exactly once.
+        
+        Returns what the donation_completed webhook needs ({'campaign_title',
+        'organisation_name'}), or None if the donation was no longer pending
+        because an earlier or concurrent request already completed it.
+        
+        Where the deployment supports transactions the flip and the counters
+        commit together. On a standalone server the flip also records the
+        counter steps still owed in pending_counters, and each step is struck
+        off as it lands, so a completion cut short is finished later by
+        finish_counters() (a repeated complete(), or `flask db
+        finish-completions`) instead of being half applied for good.
+        """
+        if transactions_supported(current_app):
+            with mongo.cx.start_session() as session:
+                return session.with_transaction(self._complete)
+        
+        details = self._complete(tracked=True)
+        if details is None:
+            self.finish_counters()
+        return details
+    
+    def _complete(self, session=None, tracked=False):
+        # Only the request that wins this conditional flip touches the counters
+        now = datetime.utcnow()
+        update = {'payment_status': 'completed', 'completed_at': now}
+        if tracked:
+            steps = [step for step in Donation.COUNTER_STEPS if step != 'campaign' or self.campaign_id]
+            update.update(Donation._lease(now), pending_counters=steps)
+        donation_data = mongo.db.donations.find_one_and_update(
+            {'_id': self._id, 'payment_status': 'pending'},
+            {'$set': update},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if donation_data is None:
+            return None
+        self.__dict__.update(donation_data)
         
-        # Update campaign raised amount if payment is completed
-        if status == 'completed' and self.campaign_id:
-            mongo.db.campaigns.update_one(
-                {'_id': self.campaign_id},
-                {'$inc': {'raised_amount': self.amount}}
-            )
+        steps = donation_data.get('pending_counters') if tracked else Donation.COUNTER_STEPS
+        return self._apply_counters(steps, session=session)
+    
+    @staticmethod
+    def _lease(now):
+        lease = timedelta(seconds=current_app.config.get('COMPLETION_LEASE', 60))
+        return {'counters_lease_id': ObjectId(), 'counters_leased_until': now + lease}
+    
+    def _apply_counters(self, steps, session=None):
+        """Apply counter steps in order, striking each off pending_counters while
+        this request holds the completion lease; stops if the lease was lost"""
+        now = datetime.utcnow()
+        lease_id = getattr(self, 'counters_lease_id', None) if session is None else None
+        campaign = organisation = None
+        
+        for position, step in enumerate(steps):
+            # Counter updates hand back the fields the webhook and rollup need
+            if step == 'campaign' and self.campaign_id:
+                campaign = mongo.db.campaigns.find_one_and_update(
+                    {'_id': self.campaign_id},
+                    {'$inc': {'raised_amount': self.amount, 'version': 1}, '$set': {'updated_at': now}},
+                    projection={'title': 1, 'category': 1},
+                    session=session
+                )
+                identity_map.invalidate('campaigns', self.campaign_id)
+            elif step == 'organisation':
+                organisation = mongo.db.organisations.find_one_and_update(
+                    {'_id': self.organisation_id},
+                    {'$inc': {'total_donations': self.amount, 'version': 1}, '$set': {'updated_at': now}},
+                    projection={'name': 1},
+                    session=session
+                )
+                identity_map.invalidate('organisations', self.organisation_id)
+            elif step == 'platform':
+                PlatformStats.increment(completed_donations=1, total_raised=self.amount, session=session)
+            elif step == 'rollup':
+                if campaign is None and self.campaign_id:
+                    # Finishing a completion whose campaign step already landed
+                    campaign = mongo.db.campaigns.find_one({'_id': self.campaign_id}, {'title': 1, 'category': 1})
+                DonationRollup.record(self, campaign.get('category') if campaign else None, session=session)
+            elif step == 'summary':
+                DonationSummary.record(self, session=session)
             
-        # Update organisation total donations
-        if status == 'completed':
-            mongo.db.organisations.update_one(
-                {'_id': self.organisation_id},
-                {'$inc': {'total_donations': self.amount}}
-            )
+            if lease_id is None:
+                continue
+            if position == len(steps) - 1:
+                done = {'$unset': {'pending_counters': '', 'counters_lease_id': '', 'counters_leased_until': ''}}
+            else:
+                done = {'$pull': {'pending_counters': step}}
+            result = mongo.db.donations.update_one({'_id': self._id, 'counters_lease_id': lease_id}, done)
+            if result.matched_count == 0:
+                current_app.logger.warning(f"Donation {self._id} counters taken over after step {step}")
+                break
         
-        return self
+        return {
+            'campaign_title': campaign.get('title') if campaign else None,
+            'organisation_name': organisation.get('name') if organisation else None
+        }
+    
+    def finish_counters(self):
+        """Apply counter steps a stalled completion left in pending_counters.
+        
+        Only takes over once the original request's lease has run out, so it
+        never races one still in progress. Returns whether it did any work.
+        """
+        now = datetime.utcnow()
+        donation_data = mongo.db.donations.find_one_and_update(
+            {'_id': self._id, 'pending_counters.0': {'$exists': True}, 'counters_leased_until': {'$lt': now}},
+            {'$set': Donation._lease(now)},
+            return_document=ReturnDocument.AFTER
+        )
+        if donation_data is None:
+            return False
+        self.__dict__.update(donation_data)
+        self._apply_counters(donation_data['pending_counters'])
+        return True
@@ -0,0 +1,136 @@
+from extensions import mongo
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne
+
+def month_start(date):
+    return datetime(date.year, date.month, 1)
+
+def next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def months_before(month, count):
+    year, index = divmod(month.year * 12 + month.month - 1 - count, 12)
+    return datetime(year, index + 1, 1)
+
+class DonationRollup:
+    """Completed-donation totals per (month, organisation, campaign, category).
+    
+    Donation.update_status adds each completed donation to its row, so
+    reports aggregate a few rows per month instead of every donation.
+    `flask db rebuild-rollups` recomputes history one month at a time.
+    """
+    INDEXES = [
+        IndexModel([('month', DESCENDING), ('organisation_id', ASCENDING),
+                    ('campaign_id', ASCENDING), ('category', ASCENDING)], unique=True),
+        IndexModel([('organisation_id', ASCENDING), ('month', DESCENDING)]),
+    ]
+    
+    @staticmethod
+    def record(donation, category=None, session=None):
+        """Add one completed donation to its monthly row"""
+        mongo.db.donation_rollups_monthly.update_one(
+            {
+                'month': month_start(donation.created_at),
+                'organisation_id': donation.organisation_id,
+                'campaign_id': donation.campaign_id,
+                'category': category
+            },
+            {
+                '$inc': {'total': donation.amount, 'count': 1},
+                '$set': {'updated_at': datetime.utcnow()}
+            },
+            upsert=True,
+            session=session
+        )
+    
+    @staticmethod
+    def monthly_totals(organisation_id=None, months=12):
+        """Newest-first [{'_id': {'year', 'month'}, 'total', 'count'}] for the last months"""
+        # Bounded on month so both the overall and per-organisation reports scan an index range
+        match = {'month': {'$gte': months_before(month_start(datetime.utcnow()), months - 1)}}
+        if organisation_id is not None:
+            match['organisation_id'] = organisation_id
+        pipeline = [
+            {'$match': match},
+            {'$group': {
+                '_id': '$month',
+                'total': {'$sum': '$total'},
+                'count': {'$sum': '$count'}
+            }},
+            {'$sort': {'_id': -1}},
+            {'$limit': months},
+            {'$project': {
+                '_id': {'year': {'$year': '$_id'}, 'month': {'$month': '$_id'}},
+                'total': 1,
+                'count': 1
+            }}
+        ]
+        return list(mongo.db.donation_rollups_monthly.aggregate(pipeline))
+    
+    @staticmethod
+    def months():
+        """First day of every month that has a completed donation"""
+        bounds = list(mongo.db.donations.aggregate([
+            {'$match': {'payment_status': 'completed'}},
+            {'$group': {'_id': None, 'first': {'$min': '$created_at'}, 'last': {'$max': '$created_at'}}}
+        ]))
+        if not bounds:
+            return []
+        
+        month, last = month_start(bounds[0]['first']), month_start(bounds[0]['last'])
+        months = []
+        while month <= last:
+            months.append(month)
+            month = next_month(month)
+        return months
+    
+    @staticmethod
+    def rebuild_month(month):
+        """Recompute one month's rows from the donations; returns the row count.
+        
+        Rows are replaced by upsert on their unique key rather than deleted and
+        reinserted, so a record() landing mid-rebuild cannot collide with them.
+        Rows the donations no longer support are dropped afterwards, unless a
+        record() touched them since the rebuild started.
+        """
+        started = datetime.utcnow()
+        rows = list(mongo.db.donations.aggregate([
+            {'$match': {
+                'payment_status': 'completed',
+                'created_at': {'$gte': month, '$lt': next_month(month)}
+            }},
+            {'$group': {
+                '_id': {'organisation_id': '$organisation_id', 'campaign_id': '$campaign_id'},
+                'total': {'$sum': '$amount'},
+                'count': {'$sum': 1}
+            }},
+            {'$lookup': {
+                'from': 'campaigns',
+                'localField': '_id.campaign_id',
+                'foreignField': '_id',
+                'pipeline': [{'$project': {'category': 1}}],
+                'as': 'campaign'
+            }}
+        ]))
+        
+        docs = [{
+            'month': month,
+            'organisation_id': row['_id'].get('organisation_id'),
+            'campaign_id': row['_id'].get('campaign_id'),
+            'category': row['campaign'][0].get('category') if row['campaign'] else None,
+            'total': row['total'],
+            'count': row['count'],
+            'updated_at': started
+        } for row in rows]
+        
+        keys = ('month', 'organisation_id', 'campaign_id', 'category')
+        if docs:
+            mongo.db.donation_rollups_monthly.bulk_write([
+                ReplaceOne({key: doc[key] for key in keys}, doc, upsert=True) for doc in docs
+            ], ordered=False)
+        mongo.db.donation_rollups_monthly.delete_many({
+            'month': month,
+            'updated_at': {'$lt': started},
+            '$nor': [{key: doc[key] for key in keys} for doc in docs] or [{'_id': None}]
+        })
+        return len(docs)
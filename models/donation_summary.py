@@ -0,0 +1,122 @@
+from extensions import mongo
+from datetime import datetime
+from pymongo import ReplaceOne
+
+class DonationSummary:
+    """Running totals of completed donations per donor and per organisation.
+    
+    One document per owner in donor_summaries / organisation_summaries,
+    keyed by the owner's _id. Donation.update_status folds each completed
+    donation in with a single atomic update per document: totals and counts
+    are $inc'd, distinct campaigns and organisations are $addToSet, and the
+    newest donation ids are $push'd onto a ring capped at RECENT_LIMIT.
+    
+    record() upserts, so a summary it creates for an owner with earlier
+    donations only holds the new ones; only rebuilt documents carry
+    rebuilt_at, and get() rebuilds any summary without it.
+    """
+    RECENT_LIMIT = 10
+    
+    # summary kind -> (collection, owner field on donations)
+    KINDS = {
+        'donor': ('donor_summaries', 'donor_id'),
+        'organisation': ('organisation_summaries', 'organisation_id'),
+    }
+    
+    @staticmethod
+    def record(donation, session=None):
+        """Fold one completed donation into its donor's and organisation's summaries"""
+        now = datetime.utcnow()
+        recent = {'$each': [donation._id], '$position': 0, '$slice': DonationSummary.RECENT_LIMIT}
+        
+        donor_sets = {'organisation_ids': donation.organisation_id}
+        org_sets = {}
+        if donation.campaign_id:
+            donor_sets['campaign_ids'] = donation.campaign_id
+            org_sets['campaign_ids'] = donation.campaign_id
+        
+        for kind, add_to_set in (('donor', donor_sets), ('organisation', org_sets)):
+            collection, owner_field = DonationSummary.KINDS[kind]
+            update = {
+                '$inc': {'total': donation.amount, 'count': 1},
+                '$push': {'recent_donation_ids': recent},
+                '$set': {'updated_at': now}
+            }
+            if add_to_set:
+                update['$addToSet'] = add_to_set
+            mongo.db[collection].update_one(
+                {'_id': getattr(donation, owner_field)}, update, upsert=True, session=session
+            )
+    
+    @staticmethod
+    def get(kind, owner_id):
+        """The owner's summary document, built from its donations on first use"""
+        collection, _ = DonationSummary.KINDS[kind]
+        summary = mongo.db[collection].find_one({'_id': owner_id})
+        if summary is None or 'rebuilt_at' not in summary:
+            summary = DonationSummary.rebuild(kind, owner_id)
+        
+        for field in ('campaign_ids', 'organisation_ids', 'recent_donation_ids'):
+            summary.setdefault(field, [])
+        summary.setdefault('total', 0)
+        summary.setdefault('count', 0)
+        return summary
+    
+    @staticmethod
+    def _pipeline(owner_field, match):
+        return [
+            {'$match': dict(match, payment_status='completed')},
+            {'$sort': {'created_at': -1}},
+            {'$group': {
+                '_id': f'${owner_field}',
+                'total': {'$sum': '$amount'},
+                'count': {'$sum': 1},
+                'campaign_ids': {'$addToSet': '$campaign_id'},
+                'organisation_ids': {'$addToSet': '$organisation_id'},
+                'recent_donation_ids': {'$push': '$_id'}
+            }},
+            {'$project': {
+                'total': 1,
+                'count': 1,
+                # Direct donations have no campaign
+                'campaign_ids': {'$filter': {'input': '$campaign_ids', 'cond': {'$ne': ['$$this', None]}}},
+                'organisation_ids': 1,
+                'recent_donation_ids': {'$slice': ['$recent_donation_ids', DonationSummary.RECENT_LIMIT]}
+            }}
+        ]
+    
+    @staticmethod
+    def _document(kind, row):
+        row['rebuilt_at'] = row['updated_at'] = datetime.utcnow()
+        if kind == 'organisation':
+            row.pop('organisation_ids', None)
+        return row
+    
+    @staticmethod
+    def rebuild(kind, owner_id):
+        """Recompute one owner's summary from its completed donations"""
+        collection, owner_field = DonationSummary.KINDS[kind]
+        rows = list(mongo.db.donations.aggregate(DonationSummary._pipeline(owner_field, {owner_field: owner_id})))
+        summary = DonationSummary._document(kind, rows[0] if rows else {
+            '_id': owner_id, 'total': 0, 'count': 0, 'campaign_ids': [], 'recent_donation_ids': []
+        })
+        mongo.db[collection].replace_one({'_id': owner_id}, summary, upsert=True)
+        return summary
+    
+    @staticmethod
+    def rebuild_all(kind, batch_size=500):
+        """Recompute every summary of one kind; returns how many were written"""
+        collection, owner_field = DonationSummary.KINDS[kind]
+        written = 0
+        batch = []
+        for row in mongo.db.donations.aggregate(DonationSummary._pipeline(owner_field, {}), allowDiskUse=True):
+            summary = DonationSummary._document(kind, row)
+            batch.append(ReplaceOne({'_id': summary['_id']}, summary, upsert=True))
+            if len(batch) >= batch_size:
+                mongo.db[collection].bulk_write(batch, ordered=False)
+                written += len(batch)
+                batch = []
+        if batch:
+            mongo.db[collection].bulk_write(batch, ordered=False)
+            written += len(batch)
+        return written
@@ -0,0 +1,58 @@
+from flask import g, has_app_context
+
+# Request-scoped identity map: each (collection, _id, projection profile) is
+# loaded from MongoDB at most once per request. A full-document entry also
+# answers lookups for any narrower profile. Lives on flask.g, so it is thrown
+# away with the request and never serves data across requests.
+
+MISSING = object()
+
+def _state():
+    if not has_app_context():
+        return None
+    if 'identity_map' not in g:
+        g.identity_map = {}
+        g.identity_map_stats = {'hits': 0, 'misses': 0}
+    return g.identity_map
+
+def lookup(collection, _id, projection=None):
+    """Return the cached object (possibly None for a known miss) or MISSING"""
+    identity_map = _state()
+    if identity_map is None or not _cacheable(projection):
+        return MISSING
+    
+    projection = _profile(projection)
+    for key in ((collection, _id, None), (collection, _id, projection)):
+        if key in identity_map:
+            g.identity_map_stats['hits'] += 1
+            return identity_map[key]
+    
+    g.identity_map_stats['misses'] += 1
+    return MISSING
+
+def store(collection, _id, projection, obj):
+    identity_map = _state()
+    if identity_map is not None and _cacheable(projection):
+        identity_map[(collection, _id, _profile(projection))] = obj
+    return obj
+
+def invalidate(collection, _id):
+    """Drop every cached profile of a document after it has been written"""
+    identity_map = _state()
+    if identity_map is None:
+        return
+    for key in [key for key in identity_map if key[0] == collection and key[1] == _id]:
+        del identity_map[key]
+
+def stats():
+    """Hit/miss counters for the current request"""
+    if not has_app_context() or 'identity_map_stats' not in g:
+        return {'hits': 0, 'misses': 0}
+    return dict(g.identity_map_stats)
+
+def _profile(projection):
+    return None if projection == 'detail' else projection
+
+def _cacheable(projection):
+    # Named profiles (or the whole document) only; ad-hoc dicts are not hashable keys
+    return projection is None or isinstance(projection, str)
@@ -1,27 +1,91 @@
 from bson.objectid import ObjectId
 from extensions import mongo
 from datetime import datetime
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument, IndexModel
+from pymongo.errors import DuplicateKeyError
+from io import BytesIO
 import base64
+import hashlib
+import re
+
+DATA_URL_PATTERN = re.compile(r'^data:(?P<content_type>[\w.+-]+/[\w.+-]+);base64,(?P<data>.+)$', re.DOTALL)
+
+# Image bytes live in GridFS (image_files.files / image_files.chunks); the
+# images collection only holds metadata and the file ids.
+BUCKET_NAME = 'image_files'
+CHUNK_SIZE = 255 * 1024  # GridFS default chunk size
+
+def get_bucket():
+    return GridFSBucket(mongo.db, bucket_name=BUCKET_NAME, chunk_size_bytes=CHUNK_SIZE)
+
+def store_stream(stream, filename, content_type):
+    """Copy a file-like object into GridFS one chunk at a time.
+    
+    Returns (file_id, length, sha256 hex digest).
+    """
+    hasher = hashlib.sha256()
+    length = 0
+    grid_in = get_bucket().open_upload_stream(filename, metadata={'content_type': content_type})
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            grid_in.write(chunk)
+            length += len(chunk)
+    except:
+        grid_in.abort()
+        raise
+    grid_in.close()
+    return grid_in._id, length, hasher.hexdigest()
+
+def iter_file(file_id):
+    """Yield the chunks of a GridFS file"""
+    grid_out = get_bucket().open_download_stream(file_id)
+    try:
+        for chunk in grid_out:
+            yield chunk
+    finally:
+        grid_out.close()
 
 class Image:
-    def __init__(self, filename, content_type, data, uploader_id, **kwargs):
+    # Widths (in px) that templates may request through image_url()
+    SIZES = (64, 320, 800)
+    
+    INDEXES = [
+        # Content address; legacy documents without a digest are left out
+        IndexModel('sha256', unique=True, partialFilterExpression={'sha256': {'$type': 'string'}}),
+    ]
+    
+    def __init__(self, filename, content_type, file_id, uploader_id, **kwargs):
         self.filename = filename
         self.content_type = content_type
-        self.data = data  # base64 encoded data
+        self.file_id = file_id  # GridFS file holding the original bytes
+        self.length = kwargs.get('length', 0)
+        self.sha256 = kwargs.get('sha256')
+        self.ref_count = 1  # documents (users, organisations) pointing at this image
         self.uploader_id = ObjectId(uploader_id)
         self.created_at = datetime.utcnow()
         self.alt_text = kwargs.get('alt_text', '')
         self.category = kwargs.get('category', 'general')  # profile, banner, campaign, organisation
+        self.variants = kwargs.get('variants', {})  # '320' / '320.webp' -> {'content_type', 'file_id', 'length'}
     
     def save(self):
         image_data = {
             'filename': self.filename,
             'content_type': self.content_type,
-            'data': self.data,
+            'file_id': self.file_id,
+            'length': self.length,
+            'sha256': self.sha256,
+            'ref_count': self.ref_count,
             'uploader_id': self.uploader_id,
             'created_at': self.created_at,
             'alt_text': self.alt_text,
-            'category': self.category
+            'category': self.category,
+            'variants': self.variants
         }
         result = mongo.db.images.insert_one(image_data)
         self._id = result.inserted_id
@@ -39,21 +103,181 @@ class Image:
             pass
         return None
     
+    @staticmethod
+    def get_metadata(image_id):
+        """Load an image without any legacy inline bytes"""
+        try:
+            image_data = mongo.db.images.find_one(
+                {'_id': ObjectId(image_id)},
+                {'data': 0, 'variants.data': 0}
+            )
+            if image_data:
+                image = Image.__new__(Image)
+                image.__dict__.update(image_data)
+                return image
+        except:
+            pass
+        return None
+    
     @staticmethod
     def create_from_file(file, uploader_id, **kwargs):
         if file and file.filename:
-            file_data = file.read()
-            encoded_data = base64.b64encode(file_data).decode('utf-8')
+            image, created = Image.create_from_stream(
+                file,
+                file.filename,
+                file.content_type,
+                uploader_id,
+                **kwargs
+            )
             
+            # Thumbnails and WebP copies are rendered off the request path;
+            # a re-upload of known bytes already has them
+            if created:
+                from utils.image_pipeline import schedule_variants
+                schedule_variants(image._id)
+            return image
+        return None
+    
+    @staticmethod
+    def create_from_data_url(data_url, uploader_id, **kwargs):
+        """Store a legacy inline data URL as an image document"""
+        match = DATA_URL_PATTERN.match(data_url or '')
+        if not match:
+            return None
+        
+        image, _ = Image.create_from_stream(
+            BytesIO(base64.b64decode(match.group('data'))),
+            kwargs.pop('filename', 'migrated'),
+            match.group('content_type'),
+            uploader_id,
+            **kwargs
+        )
+        return image
+    
+    @staticmethod
+    def create_from_stream(stream, filename, content_type, uploader_id, **kwargs):
+        """Store bytes keyed by their SHA-256, reusing an existing image with the same content.
+        
+        Returns (image, created). A reused image gains a reference and the
+        freshly streamed copy is discarded.
+        """
+        file_id, length, digest = store_stream(stream, filename, content_type)
+        
+        existing = Image.acquire(digest)
+        if not existing:
             image = Image(
-                filename=file.filename,
-                content_type=file.content_type,
-                data=encoded_data,
+                filename=filename,
+                content_type=content_type,
+                file_id=file_id,
                 uploader_id=uploader_id,
+                length=length,
+                sha256=digest,
                 **kwargs
             )
-            return image.save()
+            try:
+                return image.save(), True
+            except DuplicateKeyError:
+                # Another request stored the same bytes since acquire() ran
+                existing = Image.acquire(digest)
+        
+        get_bucket().delete(file_id)
+        return existing, False
+    
+    @staticmethod
+    def acquire(digest):
+        """Take a reference on the image with this content hash, if one exists"""
+        image_data = mongo.db.images.find_one_and_update(
+            {'sha256': digest},
+            {'$inc': {'ref_count': 1}},
+            projection={'data': 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if image_data:
+            image = Image.__new__(Image)
+            image.__dict__.update(image_data)
+            return image
         return None
     
-    def get_data_url(self):
-        return f"data:{self.content_type};base64,{self.data}"
+    @staticmethod
+    def release(image_id):
+        """Drop a reference; the image and its GridFS files go with the last one"""
+        try:
+            image_data = mongo.db.images.find_one_and_update(
+                {'_id': ObjectId(image_id)},
+                {'$inc': {'ref_count': -1}},
+                projection={'data': 0},
+                return_document=ReturnDocument.AFTER
+            )
+        except:
+            return False
+        
+        if not image_data or image_data.get('ref_count', 0) > 0:
+            return False
+        
+        result = mongo.db.images.delete_one({'_id': image_data['_id'], 'ref_count': {'$lte': 0}})
+        if not result.deleted_count:
+            return False
+        
+        bucket = get_bucket()
+        file_ids = [image_data.get('file_id')]
+        file_ids += [v.get('file_id') for v in (image_data.get('variants') or {}).values()]
+        for file_id in file_ids:
+            if file_id is not None:
+                try:
+                    bucket.delete(file_id)
+                except NoFile:
+                    pass
+        return True
+    
+    @staticmethod
+    def variant_key(width, webp=False):
+        return f"{width}.webp" if webp else str(width)
+    
+    def get_variant(self, width=None, webp=False):
+        """Return the stored variant for width, or None if it has not been generated"""
+        if width is None:
+            return None
+        return (getattr(self, 'variants', None) or {}).get(Image.variant_key(width, webp))
+    
+    def set_variants(self, variants):
+        self.variants = variants
+        mongo.db.images.update_one(
+            {'_id': self._id},
+            {'$set': {'variants': variants}}
+        )
+        return self
+    
+    def open_stream(self, width=None, webp=False):
+        """Return (content_type, length, chunk iterator) for the original or a stored variant"""
+        variant = self.get_variant(width, webp)
+        if variant:
+            return variant['content_type'], variant['length'], iter_file(variant['file_id'])
+        
+        if getattr(self, 'file_id', None) is None:
+            # Legacy document still holding base64 bytes inline
+            image_data = mongo.db.images.find_one({'_id': self._id}, {'data': 1})
+            data = base64.b64decode(image_data['data'])
+            return self.content_type, len(data), iter([data])
+        
+        return self.content_type, self.length, iter_file(self.file_id)
+    
+    def move_to_gridfs(self):
+        """Move legacy inline base64 bytes into GridFS"""
+        image_data = mongo.db.images.find_one({'_id': self._id}, {'data': 1})
+        if not image_data or not image_data.get('data'):
+            return self
+        
+        self.file_id, self.length, self.sha256 = store_stream(
+            BytesIO(base64.b64decode(image_data['data'])),
+            self.filename,
+            self.content_type
+        )
+        update = {'file_id': self.file_id, 'length': self.length, 'sha256': self.sha256}
+        try:
+            mongo.db.images.update_one({'_id': self._id}, {'$set': update, '$unset': {'data': ''}})
+        except DuplicateKeyError:
+            # Same bytes already stored under another document; keep this one unaddressed
+            del update['sha256']
+            self.sha256 = None
+            mongo.db.images.update_one({'_id': self._id}, {'$set': update, '$unset': {'data': ''}})
+        return self
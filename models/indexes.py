@@ -0,0 +1,28 @@
+from extensions import mongo
+
+def collection_indexes():
+    """(collection name, [IndexModel, ...]) for every collection the app queries"""
+    from models.user import User
+    from models.organisation import Organisation
+    from models.campaign import Campaign
+    from models.donation import Donation
+    from models.image import Image
+    from models.donation_rollup import DonationRollup
+    from utils.webhook_dispatcher import OUTBOX_INDEXES
+    
+    return [
+        ('users', User.INDEXES),
+        ('organisations', Organisation.INDEXES),
+        ('campaigns', Campaign.INDEXES),
+        ('donations', Donation.INDEXES),
+        ('images', Image.INDEXES),
+        ('donation_rollups_monthly', DonationRollup.INDEXES),
+        ('webhook_outbox', OUTBOX_INDEXES),
+    ]
+
+def ensure_indexes():
+    """Create all declared indexes; returns {collection: [index names]}"""
+    created = {}
+    for collection, indexes in collection_indexes():
+        created[collection] = mongo.db[collection].create_indexes(indexes)
+    return created
@@ -1,8 +1,38 @@
 from bson.objectid import ObjectId
 from extensions import mongo
+from utils.helpers import keyset_paginate, resolve_projection
+from utils.cache import TTLCache
+from utils.typeahead import index_organisation
+from utils.fragment_cache import invalidate_fragments
+from models import identity_map
+from models.platform_stats import PlatformStats
 from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+# Raw result pages of recent searches, keyed by (query, page, per_page)
+_search_cache = TTLCache(maxsize=256)
 
 class Organisation:
+    INDEXES = [
+        IndexModel('user_id'),
+        IndexModel([('is_verified', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('total_donations', DESCENDING)]),
+        IndexModel([('name', TEXT), ('mission', TEXT)], weights={'name': 10, 'mission': 1},
+                   name='organisation_text'),
+    ]
+    
+    # Named field sets for list views; 'detail' loads the whole document
+    PROJECTIONS = {
+        'card': ('name', 'description', 'logo_image', 'banner_image', 'total_donations',
+                 'is_verified', 'created_at'),
+        'row': ('name', 'logo_image', 'website', 'registration_number', 'is_verified',
+                'total_donations', 'user_id', 'created_at'),
+        # Just what a conditional GET needs to build its validator
+        'validator': ('version', 'updated_at', 'created_at'),
+        'detail': None,
+    }
+    
     def __init__(self, name, description, mission, user_id, **kwargs):
         self.name = name
         self.description = description
@@ -32,23 +62,77 @@ class Organisation:
             'website': self.website,
             'phone': self.phone,
             'address': self.address,
-            'registration_number': self.registration_number
+            'registration_number': self.registration_number,
+            'version': 1,
+            'updated_at': self.created_at
         }
         result = mongo.db.organisations.insert_one(org_data)
         self._id = result.inserted_id
+        PlatformStats.increment(organisations=1, verified_organisations=int(bool(self.is_verified)))
+        index_organisation(self)
+        invalidate_fragments('organisations')
         return self
     
     @staticmethod
-    def get_by_id(org_id):
+    def get_by_id(org_id, projection=None):
+        """Load by id, at most once per request (see models.identity_map)"""
         try:
-            org_data = mongo.db.organisations.find_one({'_id': ObjectId(org_id)})
-            if org_data:
+            _id = ObjectId(org_id)
+        except:
+            return None
+        
+        org = identity_map.lookup('organisations', _id, projection)
+        if org is not identity_map.MISSING:
+            return org
+        
+        org = None
+        org_data = mongo.db.organisations.find_one(
+            {'_id': _id},
+            resolve_projection(Organisation.PROJECTIONS, projection)
+        )
+        if org_data:
+            org = Organisation.__new__(Organisation)
+            org.__dict__.update(org_data)
+        return identity_map.store('organisations', _id, projection, org)
+    
+    @staticmethod
+    def get_many(org_ids, projection=None, as_dict=False):
+        """Load several organisations with one $in query.
+        
+        Returns them in the order requested (unknown ids are skipped), or a
+        dict keyed by ObjectId when as_dict is set. Ids already loaded this
+        request come from the identity map.
+        """
+        ids = []
+        for org_id in org_ids:
+            try:
+                ids.append(ObjectId(org_id))
+            except:
+                pass
+        ids = list(dict.fromkeys(ids))
+        
+        found = {}
+        for _id in ids:
+            org = identity_map.lookup('organisations', _id, projection)
+            if org is not identity_map.MISSING:
+                found[_id] = org
+        
+        missing = [_id for _id in ids if _id not in found]
+        if missing:
+            cursor = mongo.db.organisations.find(
+                {'_id': {'$in': missing}},
+                resolve_projection(Organisation.PROJECTIONS, projection)
+            )
+            for org_data in cursor:
                 org = Organisation.__new__(Organisation)
                 org.__dict__.update(org_data)
-                return org
-        except:
-            pass
-        return None
+                found[org._id] = org
+            for _id in missing:
+                identity_map.store('organisations', _id, projection, found.get(_id))
+        
+        if as_dict:
+            return {_id: found[_id] for _id in ids if found.get(_id)}
+        return [found[_id] for _id in ids if found.get(_id)]
     
     @staticmethod
     def get_by_user_id(user_id):
@@ -60,14 +144,68 @@ class Organisation:
         return None
     
     @staticmethod
-    def get_all():
+    def get_all(projection=None, limit=0):
+        orgs = []
+        projection = resolve_projection(Organisation.PROJECTIONS, projection)
+        for org_data in mongo.db.organisations.find({'is_verified': True}, projection).limit(limit):
+            org = Organisation.__new__(Organisation)
+            org.__dict__.update(org_data)
+            orgs.append(org)
+        return orgs
+    
+    @staticmethod
+    def get_verified_page(page=1, per_page=12, projection='card'):
+        """One page of verified organisations, newest first.
+        
+        Returns (organisations, has_next); fetches per_page + 1 documents to
+        tell whether another page exists.
+        """
+        projection = resolve_projection(Organisation.PROJECTIONS, projection)
+        cursor = mongo.db.organisations.find({'is_verified': True}, projection) \
+            .sort([('created_at', DESCENDING), ('_id', DESCENDING)]) \
+            .skip((max(page, 1) - 1) * per_page) \
+            .limit(per_page + 1)
+        
+        orgs = []
+        for org_data in cursor:
+            org = Organisation.__new__(Organisation)
+            org.__dict__.update(org_data)
+            orgs.append(org)
+        return orgs[:per_page], len(orgs) > per_page
+    
+    @staticmethod
+    def get_recent(limit=5, projection='row'):
+        """Newest organisations first"""
         orgs = []
-        for org_data in mongo.db.organisations.find({'is_verified': True}):
+        projection = resolve_projection(Organisation.PROJECTIONS, projection)
+        for org_data in mongo.db.organisations.find({}, projection).sort('created_at', DESCENDING).limit(limit):
             org = Organisation.__new__(Organisation)
             org.__dict__.update(org_data)
             orgs.append(org)
         return orgs
     
+    @staticmethod
+    def get_top_by_donations(limit=10, projection='row'):
+        """Organisations that have received the most, highest first"""
+        orgs = []
+        projection = resolve_projection(Organisation.PROJECTIONS, projection)
+        for org_data in mongo.db.organisations.find({}, projection).sort('total_donations', DESCENDING).limit(limit):
+            org = Organisation.__new__(Organisation)
+            org.__dict__.update(org_data)
+            orgs.append(org)
+        return orgs
+    
+    @staticmethod
+    def paginate(status='all', cursor=None, per_page=20, projection='row'):
+        """Keyset page of organisations, newest first; status is 'all', 'verified' or 'pending'"""
+        query = {}
+        if status == 'verified':
+            query['is_verified'] = True
+        elif status == 'pending':
+            query['is_verified'] = False
+        return keyset_paginate(mongo.db.organisations, query, cursor, per_page,
+                               projection=resolve_projection(Organisation.PROJECTIONS, projection))
+    
     def update(self, **kwargs):
         update_data = {}
         for key, value in kwargs.items():
@@ -76,12 +214,77 @@ class Organisation:
                 update_data[key] = value
         
         if update_data:
-            mongo.db.organisations.update_one(
+            previous = mongo.db.organisations.find_one_and_update(
                 {'_id': self._id},
-                {'$set': update_data}
+                {'$set': dict(update_data, updated_at=datetime.utcnow()), '$inc': {'version': 1}},
+                projection={'is_verified': 1}
             )
+            identity_map.invalidate('organisations', self._id)
+            if previous and 'is_verified' in update_data:
+                PlatformStats.increment(verified_organisations=(
+                    int(bool(update_data['is_verified'])) - int(bool(previous.get('is_verified')))
+                ))
+            index_organisation(self)
+            invalidate_fragments('organisations')
         return self
     
-    def get_campaigns(self):
+    @staticmethod
+    def search(text, page=1, per_page=12, projection='card'):
+        """Relevance-ranked page of verified organisations matching text.
+        
+        Returns (organisations, total) from one $facet aggregation over the
+        text index; pages are cached for SEARCH_CACHE_TTL seconds.
+        """
+        from flask import current_app
+        
+        key = (text.strip().lower(), page, per_page, projection)
+        result = _search_cache.get(key, None)
+        if result is None:
+            results = [{'$sort': {'score': {'$meta': 'textScore'}, '_id': 1}},
+                       {'$skip': (max(page, 1) - 1) * per_page},
+                       {'$limit': per_page}]
+            fields = resolve_projection(Organisation.PROJECTIONS, projection)
+            if fields:
+                results.append({'$project': fields})
+            
+            facets = list(mongo.db.organisations.aggregate([
+                {'$match': {'$text': {'$search': text}, 'is_verified': True}},
+                {'$facet': {'results': results, 'total': [{'$count': 'count'}]}}
+            ]))[0]
+            result = (facets['results'], facets['total'][0]['count'] if facets['total'] else 0)
+            _search_cache.set(key, result, current_app.config.get('SEARCH_CACHE_TTL', 60))
+        
+        docs, total = result
+        orgs = []
+        for org_data in docs:
+            org = Organisation.__new__(Organisation)
+            org.__dict__.update(org_data)
+            orgs.append(org)
+        return orgs, total
+    
+    @staticmethod
+    def touch(org_id, session=None):
+        """Bump the version of an organisation whose page shows something that changed"""
+        mongo.db.organisations.update_one(
+            {'_id': ObjectId(org_id)},
+            {'$inc': {'version': 1}, '$set': {'updated_at': datetime.utcnow()}},
+            session=session
+        )
+        identity_map.invalidate('organisations', ObjectId(org_id))
+    
+    @staticmethod
+    def attach_campaign_counts(orgs):
+        """Set campaign_count on each organisation (object or raw document) in one query"""
+        from models.campaign import Campaign
+        org_ids = [org['_id'] if isinstance(org, dict) else org._id for org in orgs]
+        counts = Campaign.count_by_organisation_ids(org_ids)
+        for org, org_id in zip(orgs, org_ids):
+            if isinstance(org, dict):
+                org['campaign_count'] = counts.get(org_id, 0)
+            else:
+                org.campaign_count = counts.get(org_id, 0)
+        return orgs
+    
+    def get_campaigns(self, projection=None):
         from models.campaign import Campaign
-        return Campaign.get_by_organisation_id(str(self._id))
+        return Campaign.get_by_organisation_id(str(self._id), projection)
@@ -0,0 +1,57 @@
+from extensions import mongo
+from datetime import datetime
+
+class PlatformStats:
+    """Site-wide counters kept in a single platform_stats document.
+    
+    Writers $inc the counters as they change users, organisations,
+    campaigns and donations, so the homepage and admin dashboard read one
+    small document instead of counting collections. `flask db rebuild-stats`
+    recomputes everything from scratch if the counters ever drift.
+    """
+    DOC_ID = 'platform'
+    COUNTERS = ('users', 'organisations', 'verified_organisations', 'campaigns',
+                'active_campaigns', 'completed_donations', 'total_raised')
+    
+    @staticmethod
+    def increment(session=None, **deltas):
+        deltas = {key: value for key, value in deltas.items() if value}
+        if deltas:
+            mongo.db.platform_stats.update_one(
+                {'_id': PlatformStats.DOC_ID},
+                {'$inc': deltas, '$set': {'updated_at': datetime.utcnow()}},
+                upsert=True,
+                session=session
+            )
+    
+    @staticmethod
+    def get():
+        """Current counters, plus pending_verifications; built on first use"""
+        stats = mongo.db.platform_stats.find_one({'_id': PlatformStats.DOC_ID})
+        if stats is None or 'rebuilt_at' not in stats:
+            stats = PlatformStats.rebuild()
+        
+        stats = {key: stats.get(key, 0) for key in PlatformStats.COUNTERS}
+        stats['pending_verifications'] = stats['organisations'] - stats['verified_organisations']
+        return stats
+    
+    @staticmethod
+    def rebuild():
+        """Recount every counter from the source collections"""
+        totals = list(mongo.db.donations.aggregate([
+            {'$match': {'payment_status': 'completed'}},
+            {'$group': {'_id': None, 'total': {'$sum': '$amount'}, 'count': {'$sum': 1}}}
+        ]))
+        stats = {
+            'users': mongo.db.users.count_documents({}),
+            'organisations': mongo.db.organisations.count_documents({}),
+            'verified_organisations': mongo.db.organisations.count_documents({'is_verified': True}),
+            'campaigns': mongo.db.campaigns.count_documents({}),
+            'active_campaigns': mongo.db.campaigns.count_documents({'is_active': True}),
+            'completed_donations': totals[0]['count'] if totals else 0,
+            'total_raised': totals[0]['total'] if totals else 0,
+            'rebuilt_at': datetime.utcnow(),
+        }
+        stats['updated_at'] = stats['rebuilt_at']
+        mongo.db.platform_stats.replace_one({'_id': PlatformStats.DOC_ID}, stats, upsert=True)
+        return stats
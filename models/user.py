@@ -1,11 +1,33 @@
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from flask import current_app
-from flask_pymongo import PyMongo
+from extensions import mongo
 from bson.objectid import ObjectId
+from pymongo import DESCENDING, IndexModel
 from datetime import datetime
+from utils.helpers import keyset_paginate, resolve_projection
+from utils.cache import TTLCache
+from models.platform_stats import PlatformStats
+
+# Users loaded by id (once per authenticated request, via load_user), kept as
+# raw documents so every hit builds a fresh User. User.update bumps the
+# document's version, and a hit is only used while a projected read of that
+# version still matches, so role, status and profile edits made through any
+# worker are seen on the next request. User.update also drops the entry here.
+_user_cache = TTLCache(maxsize=1024)
 
 class User(UserMixin):
+    INDEXES = [
+        IndexModel('email', unique=True),
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ]
+    
+    # Named field sets for list views; 'detail' loads the whole document
+    PROJECTIONS = {
+        'row': ('username', 'email', 'phone', 'user_type', 'is_active', 'profile_image', 'created_at'),
+        'detail': None,
+    }
+    
     def __init__(self, username, email, password, user_type='donor', **kwargs):
         self.username = username
         self.email = email
@@ -16,7 +38,7 @@ class User(UserMixin):
         self.profile_image = kwargs.get('profile_image')
         self.phone = kwargs.get('phone')
         self.address = kwargs.get('address')
-        
+    
     def get_id(self):
         return str(self._id)
     
@@ -24,7 +46,6 @@ class User(UserMixin):
         return check_password_hash(self.password_hash, password)
     
     def save(self):
-        mongo = PyMongo(current_app)
         user_data = {
             'username': self.username,
             'email': self.email,
@@ -38,13 +59,21 @@ class User(UserMixin):
         }
         result = mongo.db.users.insert_one(user_data)
         self._id = result.inserted_id
+        PlatformStats.increment(users=1)
         return self
     
     @staticmethod
     def get_by_id(user_id):
         try:
-            mongo = PyMongo(current_app)
-            user_data = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+            user_data = _user_cache.get(str(user_id), None)
+            if user_data is not None:
+                current = mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'version': 1})
+                if current is None or current.get('version', 0) != user_data.get('version', 0):
+                    user_data = None
+            if user_data is None:
+                user_data = mongo.db.users.find_one({'_id': ObjectId(user_id)})
+                if user_data:
+                    _user_cache.set(str(user_id), user_data, current_app.config.get('USER_CACHE_TTL', 30))
             if user_data:
                 user = User.__new__(User)
                 user.__dict__.update(user_data)
@@ -53,9 +82,36 @@ class User(UserMixin):
             pass
         return None
     
+    @staticmethod
+    def get_many(user_ids, projection=None, as_dict=False):
+        """Load several users with one $in query, in the order requested"""
+        ids = []
+        for user_id in user_ids:
+            try:
+                ids.append(ObjectId(user_id))
+            except:
+                pass
+        ids = list(dict.fromkeys(ids))
+        
+        found = {}
+        cursor = mongo.db.users.find({'_id': {'$in': ids}}, resolve_projection(User.PROJECTIONS, projection))
+        for user_data in cursor:
+            user = User.__new__(User)
+            user.__dict__.update(user_data)
+            found[user._id] = user
+        
+        if as_dict:
+            return found
+        return [found[_id] for _id in ids if _id in found]
+    
+    @staticmethod
+    def paginate(cursor=None, per_page=20, projection='row'):
+        """Keyset page of users, newest first"""
+        return keyset_paginate(mongo.db.users, {}, cursor, per_page,
+                               projection=resolve_projection(User.PROJECTIONS, projection))
+    
     @staticmethod
     def get_by_email(email):
-        mongo = PyMongo(current_app)
         user_data = mongo.db.users.find_one({'email': email})
         if user_data:
             user = User.__new__(User)
@@ -71,8 +127,11 @@ class User(UserMixin):
                 update_data[key] = value
         
         if update_data:
+            # version is part of every page ETag this user sees (the navbar shows their name)
+            self.version = getattr(self, 'version', 0) + 1
             mongo.db.users.update_one(
                 {'_id': self._id},
-                {'$set': update_data}
+                {'$set': update_data, '$inc': {'version': 1}}
             )
+            _user_cache.delete(str(self._id))
         return self
@@ -11,6 +11,9 @@ from .donation import donation_bp
 from .user_dashboard import user_dashboard_bp
 from .org_dashboard import org_dashboard_bp
 from .admin import admin_bp
+from .image import image_bp
+from .search import search_bp
+from .assets import assets_bp
 
 __all__ = [
     'auth_bp',
@@ -20,5 +23,8 @@ __all__ = [
     'donation_bp',
     'user_dashboard_bp',
     'org_dashboard_bp',
-    'admin_bp'
+    'admin_bp',
+    'image_bp',
+    'search_bp',
+    'assets_bp'
 ]
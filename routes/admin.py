@@ -1,9 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from models.user import User
 from models.organisation import Organisation
 from models.campaign import Campaign
 from models.donation import Donation
+from models.platform_stats import PlatformStats
+from models.donation_rollup import DonationRollup
 from extensions import mongo
 from utils.webhook import send_webhook
 from datetime import datetime, timedelta
@@ -19,24 +21,18 @@ def require_admin():
 
 @admin_bp.route('/')
 def dashboard():
-    # Get overall statistics
-    total_users = mongo.db.users.count_documents({})
-    total_orgs = mongo.db.organisations.count_documents({})
-    total_campaigns = mongo.db.campaigns.count_documents({})
-    pending_verifications = mongo.db.organisations.count_documents({'is_verified': False})
-    
-    # Financial statistics
-    total_donations = list(mongo.db.donations.aggregate([
-        {'$match': {'payment_status': 'completed'}},
-        {'$group': {'_id': None, 'total': {'$sum': '$amount'}, 'count': {'$sum': 1}}}
-    ]))
-    
-    total_raised = total_donations[0]['total'] if total_donations else 0
-    donation_count = total_donations[0]['count'] if total_donations else 0
+    # Overall and financial statistics from the maintained counters document
+    stats = PlatformStats.get()
+    total_users = stats['users']
+    total_orgs = stats['organisations']
+    total_campaigns = stats['campaigns']
+    pending_verifications = stats['pending_verifications']
+    total_raised = stats['total_raised']
+    donation_count = stats['completed_donations']
     
     # Recent activity
-    recent_donations = list(mongo.db.donations.find().sort('created_at', -1).limit(10))
-    recent_orgs = list(mongo.db.organisations.find().sort('created_at', -1).limit(5))
+    recent_donations = Donation.get_recent(10)
+    recent_orgs = Organisation.get_recent(5)
     
     return render_template('dashboards/admin.html',
                          total_users=total_users,
@@ -50,46 +46,27 @@ def dashboard():
 
 @admin_bp.route('/users')
 def users():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 20
     
-    users = list(mongo.db.users.find().sort('created_at', -1))
-    
-    # Simple pagination
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_users = users[start:end]
-    has_next = len(users) > end
+    pagination = User.paginate(cursor, per_page)
     
     return render_template('admin/users.html',
-                         users=paginated_users,
-                         has_next=has_next,
-                         page=page)
+                         users=pagination.rows,
+                         pagination=pagination)
 
 @admin_bp.route('/organisations')
 def organisations():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 20
     status = request.args.get('status', 'all')
     
-    query = {}
-    if status == 'verified':
-        query['is_verified'] = True
-    elif status == 'pending':
-        query['is_verified'] = False
-    
-    orgs = list(mongo.db.organisations.find(query).sort('created_at', -1))
-    
-    # Simple pagination
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_orgs = orgs[start:end]
-    has_next = len(orgs) > end
+    pagination = Organisation.paginate(status, cursor, per_page)
+    Organisation.attach_campaign_counts(pagination.rows)
     
     return render_template('admin/organisations.html',
-                         organisations=paginated_orgs,
-                         has_next=has_next,
-                         page=page,
+                         organisations=pagination.rows,
+                         pagination=pagination,
                          current_status=status)
 
 @admin_bp.route('/verify-organisation/<org_id>', methods=['POST'])
@@ -114,7 +91,7 @@ def verify_organisation(org_id):
             'admin_notes': notes,
             'verified_at': datetime.utcnow().isoformat()
         })
-        
+    
     elif action == 'reject':
         # Send rejection webhook
         send_webhook('organisation_verification', {
@@ -130,40 +107,17 @@ def verify_organisation(org_id):
 
 @admin_bp.route('/financial-reports')
 def financial_reports():
-    # Monthly donation summary
-    monthly_data = list(mongo.db.donations.aggregate([
-        {'$match': {'payment_status': 'completed'}},
-        {'$group': {
-            '_id': {
-                'year': {'$year': '$created_at'},
-                'month': {'$month': '$created_at'}
-            },
-            'total': {'$sum': '$amount'},
-            'count': {'$sum': 1}
-        }},
-        {'$sort': {'_id': -1}},
-        {'$limit': 12}
-    ]))
-    
-    # Top performing campaigns
-    top_campaigns = list(mongo.db.campaigns.aggregate([
-        {'$sort': {'raised_amount': -1}},
-        {'$limit': 10}
-    ]))
-    
-    # Convert to Campaign objects
-    top_campaigns = [Campaign.get_by_id(str(c['_id'])) for c in top_campaigns]
-    top_campaigns = [c for c in top_campaigns if c]  # Filter out None values
-    
-    # Top organisations by donations received
-    top_orgs = list(mongo.db.organisations.aggregate([
-        {'$sort': {'total_donations': -1}},
-        {'$limit': 10}
-    ]))
-    
-    # Convert to Organisation objects
-    top_orgs = [Organisation.get_by_id(str(o['_id'])) for o in top_orgs]
-    top_orgs = [o for o in top_orgs if o]  # Filter out None values
+    # Monthly donation summary from the pre-aggregated rollups
+    monthly_data = DonationRollup.monthly_totals(months=12)
+    
+    # Top performing campaigns and organisations
+    top_campaigns = Campaign.get_top_by_raised(10)
+    top_orgs = Organisation.get_top_by_donations(10)
+    
+    # One query each for the campaigns' organisations (primes get_organisation)
+    # and for the top organisations' campaign counts
+    Organisation.get_many([c.organisation_id for c in top_campaigns])
+    Organisation.attach_campaign_counts(top_orgs)
     
     return render_template('admin/financial_reports.html',
                          monthly_data=monthly_data,
@@ -186,23 +140,70 @@ def database_management():
 @admin_bp.route('/api/stats')
 def api_stats():
     """API endpoint for real-time dashboard stats"""
-    stats = {
-        'total_users': mongo.db.users.count_documents({}),
-        'total_orgs': mongo.db.organisations.count_documents({}),
-        'total_campaigns': mongo.db.campaigns.count_documents({}),
-        'pending_verifications': mongo.db.organisations.count_documents({'is_verified': False})
+    stats = PlatformStats.get()
+    return jsonify({
+        'total_users': stats['users'],
+        'total_orgs': stats['organisations'],
+        'total_campaigns': stats['campaigns'],
+        'pending_verifications': stats['pending_verifications']
+    })
+
+@admin_bp.route('/api/webhooks')
+def api_webhooks():
+    """Webhook outbox depth by status plus this worker's delivery metrics"""
+    from utils.webhook_dispatcher import metrics
+    
+    outbox = {
+        row['_id']: row['count']
+        for row in mongo.db.webhook_outbox.aggregate([
+            {'$match': {'status': {'$in': ['pending', 'sending', 'dead']}}},
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+        ])
     }
-    return jsonify(stats)
+    return jsonify({'outbox': outbox, 'delivery': metrics.snapshot()})
 
 @admin_bp.route('/export/<data_type>')
 def export_data(data_type):
-    """Export data in various formats"""
-    format_type = request.args.get('format', 'csv')
+    """Stream users, organisations, campaigns or donations as CSV, NDJSON or Parquet
     
-    # This would implement actual data export functionality
-    # For now, return a simple response
-    return jsonify({
-        'success': True,
-        'message': f'Export of {data_type} in {format_type} format initiated',
-        'download_url': f'/downloads/{data_type}_{datetime.now().strftime("%Y%m%d")}.{format_type}'
-    })
+    Optional filters: start and end (YYYY-MM-DD, on created_at, end
+    exclusive) and organisation_id.
+    """
+    from flask import current_app
+    from utils.export import FORMATS, SERIALIZERS, ExportError, export_query
+    
+    format_type = request.args.get('format', 'csv')
+    if format_type not in FORMATS:
+        return jsonify({'success': False, 'message': f'Unsupported export format: {format_type}'}), 400
+    
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        start = datetime.strptime(start, '%Y-%m-%d') if start else None
+        end = datetime.strptime(end, '%Y-%m-%d') if end else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    
+    try:
+        collection, query, fields = export_query(data_type, start, end, request.args.get('organisation_id'))
+        cursor = mongo.db[collection].find(
+            query,
+            {field: 1 for field in fields},
+            batch_size=current_app.config.get('EXPORT_BATCH_SIZE', 2000)
+        )
+        chunks = SERIALIZERS[format_type](cursor, fields)
+    except ExportError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    def generate():
+        try:
+            yield from chunks
+        finally:
+            cursor.close()
+    
+    filename = f'{data_type}_{datetime.now().strftime("%Y%m%d")}.{format_type}'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=FORMATS[format_type],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
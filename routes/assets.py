@@ -0,0 +1,35 @@
+import mimetypes
+import os
+from flask import Blueprint, current_app, request, send_from_directory, abort
+from utils.assets import DIST
+
+assets_bp = Blueprint('assets', __name__)
+
+# Hashed file names change whenever the content does
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+@assets_bp.route('/<path:filename>')
+def serve(filename):
+    directory = os.path.join(current_app.static_folder, DIST)
+    if not os.path.isfile(os.path.join(directory, filename)):
+        abort(404)
+    
+    # Prefer the smallest precompressed sibling the client accepts
+    encoding = None
+    accepted = request.accept_encodings
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[candidate] and os.path.isfile(os.path.join(directory, filename + suffix)):
+            encoding = candidate
+            break
+    
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if encoding:
+        response = send_from_directory(directory, filename + ('.br' if encoding == 'br' else '.gz'),
+                                       mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype)
+    
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    response.vary.add('Accept-Encoding')
+    return response
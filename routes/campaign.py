@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
 from flask_login import login_required, current_user
 from models.campaign import Campaign
 from models.organisation import Organisation
 from utils.webhook import send_webhook
+from utils.fragment_cache import cached_fragment
+from utils.conditional import page_etag, not_modified, with_validators, last_modified, version
 from datetime import datetime
 
 campaign_bp = Blueprint('campaign', __name__)
@@ -13,38 +15,45 @@ def list():
     per_page = 12
     category = request.args.get('category', 'all')
     
-    # Get all active campaigns
-    campaigns = Campaign.get_all_active()
-    
-    # Filter by category if specified
-    if category != 'all':
-        campaigns = [c for c in campaigns if c.category.lower() == category.lower()]
+    def load(category, page):
+        # Filter, sort and paginate in MongoDB
+        paginated_campaigns, has_next = Campaign.get_active_page(category, page, per_page)
+        
+        # Load every card's organisation in one query; get_organisation() reuses them
+        Organisation.get_many([c.organisation_id for c in paginated_campaigns])
+        return {'campaigns': paginated_campaigns, 'has_next': has_next, 'page': page}
     
-    # Simple pagination simulation
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_campaigns = campaigns[start:end]
-    has_next = len(campaigns) > end
+    grid_html = cached_fragment('components/campaign_grid.html', load,
+                                tags=('campaigns', 'organisations'), category=category, page=page)
     
     return render_template('campaigns/list.html', 
-                         campaigns=paginated_campaigns,
-                         has_next=has_next,
-                         page=page,
+                         grid_html=grid_html,
                          current_category=category)
 
 @campaign_bp.route('/<id>')
 def detail(id):
-    campaign = Campaign.get_by_id(id)
-    if not campaign:
+    # Validate the client's copy from the version counters before loading the page
+    stub = Campaign.get_by_id(id, 'validator')
+    if not stub:
         flash('Campaign not found', 'danger')
         return redirect(url_for('campaign.list'))
     
+    org_stub = Organisation.get_by_id(str(stub.organisation_id), 'validator')
+    etag = page_etag('campaign', stub._id, version(stub), version(org_stub))
+    modified = last_modified(stub, org_stub)
+    response = not_modified(etag, modified)
+    if response:
+        return response
+    
+    campaign = Campaign.get_by_id(id)
+    
     # Get campaign's organisation
     organisation = campaign.get_organisation()
     
-    return render_template('campaigns/detail.html', 
-                         campaign=campaign,
-                         organisation=organisation)
+    response = make_response(render_template('campaigns/detail.html', 
+                                             campaign=campaign,
+                                             organisation=organisation))
+    return with_validators(response, etag, modified)
 
 @campaign_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -1,9 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, make_response
 from flask_login import login_required, current_user
 from models.donation import Donation
 from models.campaign import Campaign
 from models.organisation import Organisation
 from utils.webhook import send_webhook
+from utils.conditional import page_etag, not_modified, with_validators, last_modified, version
 import uuid
 
 donation_bp = Blueprint('donation', __name__)
@@ -77,13 +78,13 @@ def process_payment(donation_id):
     # Simulate payment processing (dummy payment)
     payment_method = request.form.get('payment_method')
     
-    # Update donation status to completed
-    donation.update_status('completed')
+    # Complete the donation; a repeated submission finds it no longer pending
+    details = donation.complete()
+    if details is None:
+        flash('This donation has already been processed.', 'info')
+        return redirect(url_for('donation.receipt', donation_id=donation._id))
     
     # Send webhook for completed donation
-    campaign = Campaign.get_by_id(str(donation.campaign_id))
-    organisation = Organisation.get_by_id(str(donation.organisation_id))
-    
     send_webhook('donation_completed', {
         'donation_id': str(donation._id),
         'donor_id': current_user.get_id(),
@@ -94,8 +95,8 @@ def process_payment(donation_id):
         'transaction_id': donation.transaction_id,
         'is_anonymous': donation.is_anonymous,
         'donor_email': current_user.email if not donation.is_anonymous else None,
-        'organisation_name': organisation.name,
-        'campaign_title': campaign.title if campaign else None
+        'organisation_name': details['organisation_name'],
+        'campaign_title': details['campaign_title']
     })
     
     flash('Thank you for your donation! Your payment has been processed successfully.', 'success')
@@ -109,10 +110,21 @@ def receipt(donation_id):
         flash('Receipt not found', 'danger')
         return redirect(url_for('main.index'))
     
+    # The donation is loaded anyway for the ownership check; the campaign and
+    # organisation it names only need their version counters to validate
+    campaign = Campaign.get_by_id(str(donation.campaign_id), 'validator') if donation.campaign_id else None
+    organisation = Organisation.get_by_id(str(donation.organisation_id), 'validator')
+    etag = page_etag('receipt', donation._id, donation.payment_status, version(campaign), version(organisation))
+    modified = last_modified(campaign, organisation)
+    response = not_modified(etag, modified)
+    if response:
+        return response
+    
     campaign = Campaign.get_by_id(str(donation.campaign_id)) if donation.campaign_id else None
     organisation = Organisation.get_by_id(str(donation.organisation_id))
     
-    return render_template('donation/receipt.html', 
-                         donation=donation,
-                         campaign=campaign,
-                         organisation=organisation)
+    response = make_response(render_template('donation/receipt.html', 
+                                             donation=donation,
+                                             campaign=campaign,
+                                             organisation=organisation))
+    return with_validators(response, etag, modified)
@@ -0,0 +1,40 @@
+from flask import Blueprint, Response, request, abort, make_response
+from models.image import Image
+
+image_bp = Blueprint('image', __name__)
+
+# Image documents never change once written, so a stored original or variant
+# can be cached forever. Fallbacks served in place of a missing variant must
+# not be, or browsers would keep the full-size original under the variant URL.
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+FALLBACK_CACHE = 'public, max-age=300'
+
+@image_bp.route('/<image_id>')
+@image_bp.route('/<image_id>/<int:width>')
+def serve(image_id, width=None):
+    if width is not None and width not in Image.SIZES:
+        abort(404)
+    
+    image = Image.get_metadata(image_id)
+    if not image:
+        abort(404)
+    
+    # Prefer the WebP copy when the browser names it explicitly (not via */*)
+    webp = 'image/webp' in request.headers.get('Accept', '') and bool(image.get_variant(width, webp=True))
+    variant = image.get_variant(width, webp)
+    served_width = width if variant else None
+    etag = f"{image._id}-{Image.variant_key(width, webp) if variant else 'original'}"
+    
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        # Stream GridFS chunks straight through rather than joining them in memory
+        content_type, length, chunks = image.open_stream(served_width, webp)
+        response = Response(chunks, content_type=content_type, direct_passthrough=True)
+        response.content_length = length
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE if served_width or width is None else FALLBACK_CACHE
+    if variant:
+        response.vary.add('Accept')
+    return response
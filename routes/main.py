@@ -3,32 +3,37 @@ from flask import Blueprint, render_template
 from extensions import mongo  # Import from extensions, NOT from app
 from models.organisation import Organisation
 from models.campaign import Campaign
-from flask_pymongo import PyMongo
+from models.platform_stats import PlatformStats
+from utils.fragment_cache import cached_fragment
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
 def index():
-    # Get statistics - this should now work
-    org_count = mongo.db.organisations.count_documents({'is_verified': True})
-    campaign_count = mongo.db.campaigns.count_documents({'is_active': True})
-    total_donations = mongo.db.donations.aggregate([
-        {'$match': {'payment_status': 'completed'}},
-        {'$group': {'_id': None, 'total': {'$sum': '$amount'}}}
-    ])
-    total_raised = list(total_donations)
-    total_raised = total_raised[0]['total'] if total_raised else 0
+    # Each section is rendered through the fragment cache; its loader only
+    # runs when the cached copy is missing or stale
+    def load_stats():
+        # Get statistics from the maintained counters document
+        stats = PlatformStats.get()
+        return {
+            'org_count': stats['verified_organisations'],
+            'campaign_count': stats['active_campaigns'],
+            'total_raised': stats['total_raised']
+        }
     
-    # Get featured campaigns and organisations
-    featured_campaigns = Campaign.get_all_active()[:6]
-    featured_orgs = Organisation.get_all()[:6]
+    def load_featured_campaigns():
+        featured_campaigns, _ = Campaign.get_active_page(per_page=6)
+        return {'featured_campaigns': featured_campaigns}
+    
+    def load_featured_orgs():
+        return {'featured_orgs': Organisation.get_all('card', limit=6)}
     
     return render_template('index.html', 
-                         org_count=org_count,
-                         campaign_count=campaign_count,
-                         total_raised=total_raised,
-                         featured_campaigns=featured_campaigns,
-                         featured_orgs=featured_orgs)
+                         stats_html=cached_fragment('components/platform_stats.html', load_stats, ttl=30),
+                         featured_campaigns_html=cached_fragment('components/featured_campaigns.html',
+                                                                 load_featured_campaigns, tags=('campaigns',)),
+                         featured_orgs_html=cached_fragment('components/featured_organisations.html',
+                                                            load_featured_orgs, tags=('organisations',)))
 
 @main_bp.route('/about')
 def about():
@@ -41,7 +46,6 @@ def contact():
 @main_bp.route('/test-db')
 def test_db():
     """Test database connection"""
-    mongo = PyMongo(app)
     try:
         collections = mongo.db.list_collection_names()
         return f"✅ Database connected! Collections: {collections}"
@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from models.organisation import Organisation
 from models.campaign import Campaign
 from models.donation import Donation
+from models.donation_summary import DonationSummary
 from utils.webhook import send_webhook
 
 org_dashboard_bp = Blueprint('org_dashboard', __name__)
@@ -21,17 +22,16 @@ def dashboard():
         return redirect(url_for('org_dashboard.setup_organisation'))
     
     # Get organisation statistics
-    campaigns = org.get_campaigns()
-    donations = Donation.get_by_organisation_id(str(org._id))
-    completed_donations = [d for d in donations if d.payment_status == 'completed']
+    campaigns = org.get_campaigns('card')
+    summary = DonationSummary.get('organisation', org._id)
     
-    total_raised = sum(d.amount for d in completed_donations)
-    donation_count = len(completed_donations)
+    total_raised = summary['total']
+    donation_count = summary['count']
     campaign_count = len(campaigns)
     active_campaigns = len([c for c in campaigns if c.is_active])
     
     # Recent donations (last 10)
-    recent_donations = sorted(completed_donations, key=lambda x: x.created_at, reverse=True)[:10]
+    recent_donations = Donation.get_many(summary['recent_donation_ids'], 'row')
     
     return render_template('dashboards/organisation.html',
                          organisation=org,
@@ -64,8 +64,8 @@ def setup_organisation():
         registration_number = request.form.get('registration_number')
         
         # Handle image uploads
-        logo_image_url = None
-        banner_image_url = None
+        logo_image_id = None
+        banner_image_id = None
         
         logo_image = request.files.get('logo_image')
         if logo_image and logo_image.filename:
@@ -77,7 +77,7 @@ def setup_organisation():
                 alt_text=f"{name} logo"
             )
             if image:
-                logo_image_url = image.get_data_url()
+                logo_image_id = image._id
         
         banner_image = request.files.get('banner_image')
         if banner_image and banner_image.filename:
@@ -89,7 +89,7 @@ def setup_organisation():
                 alt_text=f"{name} banner"
             )
             if image:
-                banner_image_url = image.get_data_url()
+                banner_image_id = image._id
         
         # Create organisation
         org = Organisation(
@@ -101,8 +101,8 @@ def setup_organisation():
             phone=phone,
             address=address,
             registration_number=registration_number,
-            logo_image=logo_image_url,
-            banner_image=banner_image_url
+            logo_image=logo_image_id,
+            banner_image=banner_image_id
         ).save()
         
         # Send webhook for verification request
@@ -132,7 +132,7 @@ def campaigns():
         flash('Please set up your organisation profile first.', 'warning')
         return redirect(url_for('org_dashboard.setup_organisation'))
     
-    campaigns = org.get_campaigns()
+    campaigns = org.get_campaigns('card')
     
     return render_template('dashboards/org_campaigns.html',
                          organisation=org,
@@ -149,29 +149,13 @@ def donations():
     if not org:
         return redirect(url_for('org_dashboard.setup_organisation'))
     
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 15
     
-    donations = Donation.get_by_organisation_id(str(org._id))
-    donations = sorted(donations, key=lambda x: x.created_at, reverse=True)
-    
-    # Simple pagination
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_donations = donations[start:end]
-    has_next = len(donations) > end
-    
-    # Get additional details for each donation
-    donation_details = []
-    for donation in paginated_donations:
-        campaign = Campaign.get_by_id(str(donation.campaign_id)) if donation.campaign_id else None
-        donation_details.append({
-            'donation': donation,
-            'campaign': campaign
-        })
+    # One aggregation: the page plus each row's campaign
+    pagination = Donation.history_by_organisation_id(str(org._id), cursor, per_page)
     
     return render_template('dashboards/org_donations.html',
                          organisation=org,
-                         donation_details=donation_details,
-                         has_next=has_next,
-                         page=page)
+                         donation_details=pagination.rows,
+                         pagination=pagination)
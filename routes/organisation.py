@@ -1,9 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
 from flask_login import login_required, current_user
 from models.organisation import Organisation
 from models.campaign import Campaign
 from models.user import User
 from utils.webhook import send_webhook
+from utils.fragment_cache import cached_fragment
+from utils.conditional import page_etag, not_modified, with_validators, last_modified, version
 
 org_bp = Blueprint('org', __name__)
 
@@ -12,33 +14,40 @@ def list():
     page = request.args.get('page', 1, type=int)
     per_page = 12
     
-    # Get all verified organisations
-    orgs = Organisation.get_all()
+    def load(page):
+        # Sort and paginate in MongoDB, then count the page's campaigns in one query
+        orgs, has_next = Organisation.get_verified_page(page, per_page)
+        Organisation.attach_campaign_counts(orgs)
+        return {'organisations': orgs, 'has_next': has_next, 'page': page}
     
-    # Simple pagination simulation
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_orgs = orgs[start:end]
-    has_next = len(orgs) > end
+    grid_html = cached_fragment('components/organisation_grid.html', load,
+                                tags=('organisations', 'campaigns'), page=page)
     
-    return render_template('organisations/list.html', 
-                         organisations=paginated_orgs,
-                         has_next=has_next,
-                         page=page)
+    return render_template('organisation/list.html', grid_html=grid_html)
 
 @org_bp.route('/<id>')
 def detail(id):
-    org = Organisation.get_by_id(id)
-    if not org:
+    # The organisation's version also moves when one of its campaigns changes
+    stub = Organisation.get_by_id(id, 'validator')
+    if not stub:
         flash('Organization not found', 'danger')
         return redirect(url_for('org.list'))
     
+    etag = page_etag('organisation', stub._id, version(stub))
+    modified = last_modified(stub)
+    response = not_modified(etag, modified)
+    if response:
+        return response
+    
+    org = Organisation.get_by_id(id)
+    
     # Get organisation's campaigns
-    campaigns = org.get_campaigns()
+    campaigns = org.get_campaigns('card')
     
-    return render_template('organisations/detail.html', 
-                         organisation=org,
-                         campaigns=campaigns)
+    response = make_response(render_template('organisation/detail.html', 
+                                             organisation=org,
+                                             campaigns=campaigns))
+    return with_validators(response, etag, modified)
 
 @org_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -0,0 +1,48 @@
+from flask import Blueprint, render_template, request, jsonify, url_for, current_app
+from models.campaign import Campaign
+from models.organisation import Organisation
+from utils.helpers import Pagination
+from utils.typeahead import get_index
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/')
+def results():
+    query = request.args.get('q', '').strip()[:100]
+    category = request.args.get('category', 'all')
+    scope = request.args.get('scope', 'campaigns')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 12
+    
+    campaigns, organisations, categories = [], [], []
+    pagination = None
+    if query:
+        if scope == 'organisations':
+            organisations, total = Organisation.search(query, page, per_page)
+        else:
+            scope = 'campaigns'
+            campaigns, total, categories = Campaign.search(query, category, page, per_page)
+            Organisation.get_many([c.organisation_id for c in campaigns])
+        pagination = Pagination(page, per_page, total)
+    
+    return render_template('search/results.html',
+                         query=query,
+                         scope=scope,
+                         current_category=category,
+                         campaigns=campaigns,
+                         organisations=organisations,
+                         categories=categories,
+                         pagination=pagination)
+
+@search_bp.route('/suggest')
+def suggest():
+    """Name/title suggestions for the navbar box, served from memory"""
+    query = request.args.get('q', '')[:100]
+    suggestions = []
+    for kind, _id, label in get_index(current_app).suggest(query, limit=8):
+        if kind == 'campaign':
+            url = url_for('campaign.detail', id=_id)
+        else:
+            url = url_for('org.detail', id=_id)
+        suggestions.append({'type': kind, 'label': label, 'url': url})
+    return jsonify(suggestions)
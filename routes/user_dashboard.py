@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from models.donation import Donation
 from models.campaign import Campaign
 from models.organisation import Organisation
+from models.donation_summary import DonationSummary
 from extensions import mongo
 from datetime import datetime, timedelta
 
@@ -15,37 +16,21 @@ def dashboard():
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    # Get user's donation statistics
-    user_donations = Donation.get_by_donor_id(current_user.get_id())
-    completed_donations = [d for d in user_donations if d.payment_status == 'completed']
-    
-    total_donated = sum(d.amount for d in completed_donations)
-    donation_count = len(completed_donations)
+    # Get user's donation statistics from their summary document
+    summary = DonationSummary.get('donor', current_user._id)
     
     # Get recent donations (last 5)
-    recent_donations = sorted(completed_donations, key=lambda x: x.created_at, reverse=True)[:5]
-    
-    # Get supported campaigns and organisations
-    campaign_ids = list(set(str(d.campaign_id) for d in completed_donations if d.campaign_id))
-    org_ids = list(set(str(d.organisation_id) for d in completed_donations))
-    
-    supported_campaigns = []
-    for campaign_id in campaign_ids:
-        campaign = Campaign.get_by_id(campaign_id)
-        if campaign:
-            supported_campaigns.append(campaign)
+    recent_donations = Donation.get_many(summary['recent_donation_ids'][:5], 'row')
     
-    supported_orgs = []
-    for org_id in org_ids:
-        org = Organisation.get_by_id(org_id)
-        if org:
-            supported_orgs.append(org)
+    # Only the three organisations the dashboard lists are loaded
+    supported_orgs = Organisation.get_many(summary['organisation_ids'][:3], 'row')
     
     return render_template('dashboards/user.html',
-                         total_donated=total_donated,
-                         donation_count=donation_count,
+                         total_donated=summary['total'],
+                         donation_count=summary['count'],
                          recent_donations=recent_donations,
-                         supported_campaigns=supported_campaigns,
+                         supported_campaign_count=len(summary['campaign_ids']),
+                         supported_org_count=len(summary['organisation_ids']),
                          supported_orgs=supported_orgs)
 
 @user_dashboard_bp.route('/donations')
@@ -55,33 +40,15 @@ def donations():
         flash('Access denied', 'danger')
         return redirect(url_for('main.index'))
     
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 10
     
-    user_donations = Donation.get_by_donor_id(current_user.get_id())
-    user_donations = sorted(user_donations, key=lambda x: x.created_at, reverse=True)
-    
-    # Simple pagination
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated_donations = user_donations[start:end]
-    has_next = len(user_donations) > end
-    
-    # Get campaign and organisation details for each donation
-    donation_details = []
-    for donation in paginated_donations:
-        campaign = Campaign.get_by_id(str(donation.campaign_id)) if donation.campaign_id else None
-        organisation = Organisation.get_by_id(str(donation.organisation_id))
-        donation_details.append({
-            'donation': donation,
-            'campaign': campaign,
-            'organisation': organisation
-        })
+    # One aggregation: the page plus each row's campaign and organisation
+    pagination = Donation.history_by_donor_id(current_user.get_id(), cursor, per_page)
     
     return render_template('dashboards/user_donations.html',
-                         donation_details=donation_details,
-                         has_next=has_next,
-                         page=page)
+                         donation_details=pagination.rows,
+                         pagination=pagination)
 
 @user_dashboard_bp.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -106,7 +73,11 @@ def profile():
                 alt_text=f"{username}'s profile picture"
             )
             if image:
-                current_user.update(profile_image=image.get_data_url())
+                # Re-uploads share one stored image, so hand back the old reference
+                previous_image = current_user.profile_image
+                current_user.update(profile_image=image._id)
+                if previous_image:
+                    Image.release(previous_image)
         
         current_user.update(
             username=username,
@@ -123,6 +123,54 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Navbar typeahead
+    const navbarSearch = document.querySelector('.navbar-search input[data-suggest-url]');
+    if (navbarSearch) {
+        const menu = navbarSearch.parentElement.querySelector('.navbar-suggestions');
+        let timer = null;
+        let lastQuery = '';
+        
+        navbarSearch.addEventListener('input', function() {
+            clearTimeout(timer);
+            const query = this.value.trim();
+            if (!query) {
+                menu.classList.remove('show');
+                return;
+            }
+            
+            timer = setTimeout(() => {
+                lastQuery = query;
+                fetch(`${navbarSearch.dataset.suggestUrl}?q=${encodeURIComponent(query)}`)
+                    .then(response => response.json())
+                    .then(suggestions => {
+                        if (query !== lastQuery) {
+                            return;
+                        }
+                        menu.innerHTML = '';
+                        suggestions.forEach(suggestion => {
+                            const item = document.createElement('a');
+                            item.className = 'dropdown-item';
+                            item.href = suggestion.url;
+                            item.textContent = suggestion.label;
+                            const kind = document.createElement('small');
+                            kind.className = 'text-muted ms-2';
+                            kind.textContent = suggestion.type === 'campaign' ? 'Campaign' : 'Organization';
+                            item.appendChild(kind);
+                            menu.appendChild(item);
+                        });
+                        menu.classList.toggle('show', suggestions.length > 0);
+                    })
+                    .catch(error => {
+                        console.error('Error loading suggestions:', error);
+                    });
+            }, 120);
+        });
+        
+        navbarSearch.addEventListener('blur', function() {
+            setTimeout(() => menu.classList.remove('show'), 150);
+        });
+    }
+
     // Loading states for forms
     const submitButtons = document.querySelectorAll('button[type="submit"]');
     submitButtons.forEach(button => {
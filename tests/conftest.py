@@ -0,0 +1,51 @@
+import os
+import pytest
+
+# Throwaway database the query-plan suite creates indexes in and drops afterwards
+TEST_MONGO_URI = os.environ.get('TEST_MONGO_URI', 'mongodb://localhost:27017/ngo_query_plans_test')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'mongo: runs against a local mongod at TEST_MONGO_URI')
+    
+    # Before any client exists, so the app's shared client reports to it
+    from pymongo import monitoring
+    from query_plans import recorder
+    monitoring.register(recorder)
+
+@pytest.fixture(scope='session')
+def app():
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    
+    client = MongoClient(TEST_MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+    except PyMongoError:
+        pytest.skip(f"no mongod reachable at {TEST_MONGO_URI}")
+    
+    # config.Config reads the environment when it is first imported
+    os.environ['MONGO_URI'] = TEST_MONGO_URI
+    os.environ.setdefault('SECRET_KEY', 'test')
+    os.environ['STATIC_BUILD_ON_STARTUP'] = '0'
+    from app import create_app
+    from models.indexes import ensure_indexes
+    
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        ensure_indexes()
+    yield app
+    
+    client.drop_database(client.get_default_database().name)
+    client.close()
+
+@pytest.fixture
+def db(app):
+    """The test database, emptied (indexes kept) before each test"""
+    from extensions import mongo
+    
+    with app.app_context():
+        for name in mongo.db.list_collection_names():
+            if not name.startswith('system.'):
+                mongo.db[name].delete_many({})
+        yield mongo.db
@@ -0,0 +1,174 @@
+from bson.objectid import ObjectId
+from datetime import datetime
+from pymongo import monitoring
+from extensions import mongo
+
+# Explain-based plan checks for test_query_plans.py. hot_loaders() names the
+# model loaders on hot paths; check_query_plans() runs one while the recorder
+# keeps the read commands it sends, then explains each and reports COLLSCAN
+# or in-memory SORT stages.
+
+def hot_loaders():
+    """(name, call) for every model loader on a hot path.
+    
+    Each call runs its loader with throwaway ids; check_query_plans() records
+    the commands it sends and explains them, so the shapes checked are
+    exactly the ones the models issue.
+    """
+    from flask import current_app
+    from models.user import User
+    from models.organisation import Organisation
+    from models.campaign import Campaign
+    from models.donation import Donation
+    from models.donation_rollup import DonationRollup
+    from models.donation_summary import DonationSummary
+    from models.image import Image
+    from utils.export import export_query
+    from utils.webhook_dispatcher import WebhookDispatcher
+    
+    some_id = ObjectId()
+    now = datetime.utcnow()
+    
+    def export(data_type, **filters):
+        collection, query, fields = export_query(data_type, **filters)
+        list(mongo.db[collection].find(query, {field: 1 for field in fields}).limit(1))
+    
+    return [
+        ('User.get_by_id', lambda: User.get_by_id(some_id)),
+        ('User.get_by_email', lambda: User.get_by_email('someone@example.com')),
+        ('User.get_many', lambda: User.get_many([some_id], 'row')),
+        ('User.paginate', lambda: User.paginate()),
+        ('Organisation.get_by_id', lambda: Organisation.get_by_id(some_id)),
+        ('Organisation.get_many', lambda: Organisation.get_many([some_id], 'card')),
+        ('Organisation.get_by_user_id', lambda: Organisation.get_by_user_id(some_id)),
+        ('Organisation.get_all', lambda: Organisation.get_all('card', limit=6)),
+        ('Organisation.get_verified_page', lambda: Organisation.get_verified_page(3)),
+        ('Organisation.get_recent', lambda: Organisation.get_recent()),
+        ('Organisation.get_top_by_donations', lambda: Organisation.get_top_by_donations()),
+        ('Organisation.paginate', lambda: Organisation.paginate()),
+        ('Organisation.paginate?pending', lambda: Organisation.paginate('pending')),
+        ('Organisation.search', lambda: Organisation.search('clean water plans')),
+        ('Campaign.get_by_id', lambda: Campaign.get_by_id(some_id)),
+        ('Campaign.get_many', lambda: Campaign.get_many([some_id], 'card')),
+        ('Campaign.get_by_organisation_id', lambda: Campaign.get_by_organisation_id(some_id)),
+        ('Campaign.get_all_active', lambda: Campaign.get_all_active('card')),
+        ('Campaign.get_active_page', lambda: Campaign.get_active_page()),
+        ('Campaign.get_active_page?category', lambda: Campaign.get_active_page('Education')),
+        ('Campaign.get_top_by_raised', lambda: Campaign.get_top_by_raised()),
+        ('Campaign.search', lambda: Campaign.search('clean water plans')),
+        ('Campaign.count_by_organisation_ids', lambda: Campaign.count_by_organisation_ids([some_id])),
+        ('Campaign.search?category', lambda: Campaign.search('clean water plans', 'Education')),
+        ('Donation.get_by_id', lambda: Donation.get_by_id(some_id)),
+        ('Donation.get_many', lambda: Donation.get_many([some_id], 'row')),
+        ('Donation.get_by_donor_id', lambda: Donation.get_by_donor_id(some_id)),
+        ('Donation.get_by_organisation_id', lambda: Donation.get_by_organisation_id(some_id)),
+        ('Donation.get_recent', lambda: Donation.get_recent()),
+        ('Donation.history_by_donor_id', lambda: Donation.history_by_donor_id(some_id)),
+        ('Donation.history_by_organisation_id', lambda: Donation.history_by_organisation_id(some_id)),
+        ('DonationRollup.monthly_totals', lambda: DonationRollup.monthly_totals()),
+        ('DonationRollup.monthly_totals?organisation', lambda: DonationRollup.monthly_totals(some_id)),
+        ('DonationRollup.rebuild_month', lambda: DonationRollup.rebuild_month(datetime(now.year, now.month, 1))),
+        ('DonationSummary.get donor', lambda: DonationSummary.get('donor', some_id)),
+        ('DonationSummary.get organisation', lambda: DonationSummary.get('organisation', some_id)),
+        ('Image.acquire', lambda: Image.acquire('0' * 64)),
+        ('export donations?organisation&range',
+         lambda: export('donations', start=now, end=now, organisation_id=str(some_id))),
+        ('export campaigns?range', lambda: export('campaigns', start=now, end=now)),
+        ('WebhookDispatcher.claim', lambda: WebhookDispatcher(current_app._get_current_object()).claim()),
+    ]
+
+class QueryRecorder(monitoring.CommandListener):
+    """Keeps the read commands a client sends while recording is on"""
+    def __init__(self):
+        self.commands = []
+        self.recording = False
+    
+    def started(self, event):
+        if self.recording and event.command_name in EXPLAINABLE:
+            self.commands.append(dict(event.command))
+    
+    def succeeded(self, event):
+        pass
+    
+    def failed(self, event):
+        pass
+
+# Commands explain() accepts, and the fields of each it needs
+EXPLAINABLE = {
+    'find': ('filter', 'sort', 'projection', 'skip', 'limit', 'collation', 'hint'),
+    'aggregate': ('pipeline', 'collation', 'hint'),
+    'count': ('query', 'collation', 'hint'),
+    'distinct': ('key', 'query', 'collation'),
+    'findAndModify': ('query', 'sort', 'update', 'remove', 'new', 'upsert', 'fields', 'collation'),
+}
+
+# Registered before the app creates its client (see conftest.py), so every
+# command the shared client sends passes through it
+recorder = QueryRecorder()
+
+def _explainable(command):
+    """The command trimmed to what explain() needs, plus one find per $lookup join"""
+    name = next(iter(command))
+    trimmed = {name: command[name]}
+    trimmed.update((key, command[key]) for key in EXPLAINABLE[name] if key in command)
+    if name == 'aggregate':
+        trimmed['cursor'] = {}
+    yield trimmed
+    
+    # The joined side is not in the aggregation's plan; explain it as the
+    # lookup a single local value would run
+    if name == 'aggregate':
+        for stage in command['pipeline']:
+            lookup = stage.get('$lookup')
+            if lookup and 'foreignField' in lookup:
+                yield {'find': lookup['from'], 'filter': {lookup['foreignField']: ObjectId()}}
+
+def _problems(plan):
+    """(offending stages, whether the plan groups) for a plan tree.
+    
+    A SORT above a GROUP orders the grouped rows, not the collection, so
+    only sorts below any grouping count.
+    """
+    found, grouped = set(), plan.get('stage') == 'GROUP'
+    children = [plan[key] for key in ('inputStage', 'queryPlan', 'outerStage', 'innerStage') if key in plan]
+    for child in children + plan.get('inputStages', []):
+        child_found, child_grouped = _problems(child)
+        found |= child_found
+        grouped |= child_grouped
+    if plan.get('stage') == 'COLLSCAN' or (plan.get('stage') == 'SORT' and not grouped):
+        found.add(plan['stage'])
+    return found, grouped
+
+def _winning_plans(explain):
+    if 'queryPlanner' in explain:
+        yield explain['queryPlanner']['winningPlan']
+    for stage in explain.get('stages', []):
+        if '$cursor' in stage:
+            yield stage['$cursor']['queryPlanner']['winningPlan']
+    for shard in explain.get('shards', {}).values():
+        yield from _winning_plans(shard)
+
+def plan_problems(command):
+    """Return the offending stages (COLLSCAN, SORT) in the winning plan of a command"""
+    explain = mongo.db.command('explain', command, verbosity='queryPlanner')
+    found = set()
+    for plan in _winning_plans(explain):
+        found |= _problems(plan)[0]
+    # A $sort straight after the cursor stage sorts the documents in memory
+    stages = explain.get('stages', [])
+    if len(stages) > 1 and '$sort' in stages[1]:
+        found.add('SORT')
+    return sorted(found)
+
+def check_query_plans(app, call):
+    """Run one loader and return [(command, problems)] for each query it sent"""
+    recorder.commands = []
+    with app.test_request_context():
+        recorder.recording = True
+        try:
+            call()
+        finally:
+            recorder.recording = False
+        return [(command, plan_problems(command))
+                for sent in recorder.commands
+                for command in _explainable(sent)]
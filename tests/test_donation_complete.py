@@ -0,0 +1,98 @@
+import threading
+import pytest
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+
+pytestmark = pytest.mark.mongo
+
+@pytest.fixture(params=[False, True], ids=['standalone', 'transaction'])
+def transactions(request, app, db):
+    """Run once on the tracked fallback path and once in a transaction where the server allows it"""
+    from extensions import mongo
+    
+    if request.param and 'setName' not in mongo.cx.admin.command('hello'):
+        pytest.skip('transactions need a replica set')
+    previous = app.config.get('MONGO_TRANSACTIONS')
+    app.config['MONGO_TRANSACTIONS'] = request.param
+    yield request.param
+    app.config['MONGO_TRANSACTIONS'] = previous
+
+@pytest.fixture
+def pending_donation(app, db):
+    from models.donation import Donation
+    
+    organisation_id = db.organisations.insert_one({'name': 'Org', 'total_donations': 0}).inserted_id
+    campaign_id = db.campaigns.insert_one({
+        'title': 'Campaign', 'category': 'education', 'organisation_id': organisation_id, 'raised_amount': 0
+    }).inserted_id
+    with app.app_context():
+        return Donation(25, ObjectId(), campaign_id, organisation_id).save()
+
+def assert_counted_once(db, donation):
+    assert db.campaigns.find_one({'_id': donation.campaign_id})['raised_amount'] == 25
+    assert db.organisations.find_one({'_id': donation.organisation_id})['total_donations'] == 25
+    stats = db.platform_stats.find_one({'_id': 'platform'})
+    assert (stats['completed_donations'], stats['total_raised']) == (1, 25)
+    rollups = list(db.donation_rollups_monthly.find())
+    assert [(row['category'], row['count'], row['total']) for row in rollups] == [('education', 1, 25)]
+    for collection in ('donor_summaries', 'organisation_summaries'):
+        summary = db[collection].find_one()
+        assert (summary['count'], summary['total']) == (1, 25)
+    assert 'pending_counters' not in db.donations.find_one({'_id': donation._id})
+
+def test_concurrent_completions_count_once(app, db, transactions, pending_donation):
+    """Two requests completing the same donation apply its counters exactly once"""
+    from models.donation import Donation
+    
+    barrier = threading.Barrier(2)
+    results = []
+    
+    def complete():
+        with app.app_context():
+            donation = Donation.get_by_id(pending_donation._id)
+            barrier.wait()
+            results.append(donation.complete())
+    
+    threads = [threading.Thread(target=complete) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(results, key=lambda details: details is None) == [
+        {'campaign_title': 'Campaign', 'organisation_name': 'Org'}, None
+    ]
+    assert_counted_once(db, pending_donation)
+
+def test_interrupted_completion_is_finished_once(app, db, pending_donation):
+    """Steps a stalled completion still owes are applied by finish-completions, and only those"""
+    from models.donation import Donation
+    
+    previous = app.config.get('MONGO_TRANSACTIONS')
+    app.config['MONGO_TRANSACTIONS'] = False
+    try:
+        with app.app_context():
+            donation = Donation.get_by_id(pending_donation._id)
+            donation.complete()
+        # Put back the last three steps as if the request died after the organisation update
+        for collection in ('platform_stats', 'donation_rollups_monthly', 'donor_summaries', 'organisation_summaries'):
+            db[collection].delete_many({})
+        db.donations.update_one({'_id': pending_donation._id}, {'$set': {
+            'pending_counters': ['platform', 'rollup', 'summary'],
+            'counters_lease_id': ObjectId(),
+            'counters_leased_until': datetime.utcnow() + timedelta(seconds=60)
+        }})
+        
+        # Still leased: a repeated complete() leaves it to the request that holds it
+        with app.app_context():
+            assert Donation.get_by_id(pending_donation._id).complete() is None
+        assert db.platform_stats.count_documents({}) == 0
+        
+        db.donations.update_one({'_id': pending_donation._id},
+                                {'$set': {'counters_leased_until': datetime.utcnow() - timedelta(seconds=1)}})
+        result = app.test_cli_runner().invoke(args=['db', 'finish-completions'])
+        assert result.exit_code == 0, result.output
+        assert 'Finished 1 donation(s)' in result.output
+    finally:
+        app.config['MONGO_TRANSACTIONS'] = previous
+    assert_counted_once(db, pending_donation)
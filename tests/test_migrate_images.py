@@ -0,0 +1,48 @@
+import base64
+import os
+import pytest
+from datetime import datetime
+from bson.objectid import ObjectId
+
+pytestmark = pytest.mark.mongo
+
+def test_legacy_image_and_data_url_field_share_one_copy(app, db):
+    """A field holding the same bytes as a legacy image document reuses it"""
+    encoded = base64.b64encode(os.urandom(4096)).decode('utf-8')
+    user_id = ObjectId()
+    legacy_id = db.images.insert_one({
+        'filename': 'avatar.png',
+        'content_type': 'image/png',
+        'data': encoded,
+        'uploader_id': user_id,
+        'created_at': datetime.utcnow()
+    }).inserted_id
+    db.users.insert_one({
+        '_id': user_id,
+        'email': 'legacy@example.com',
+        'profile_image': f'data:image/png;base64,{encoded}'
+    })
+    
+    result = app.test_cli_runner().invoke(args=['db', 'migrate-images'])
+    assert result.exit_code == 0, result.output
+    
+    images = list(db.images.find())
+    assert [image['_id'] for image in images] == [legacy_id]
+    assert images[0]['ref_count'] == 1
+    assert 'data' not in images[0]
+    assert db.users.find_one({'_id': user_id})['profile_image'] == legacy_id
+    assert db.image_files.files.count_documents({}) == 1
+
+def test_unreferenced_legacy_image_starts_at_zero(app, db):
+    """Legacy documents nothing points at are not pinned with a reference"""
+    db.images.insert_one({
+        'filename': 'orphan.png',
+        'content_type': 'image/png',
+        'data': base64.b64encode(os.urandom(1024)).decode('utf-8'),
+        'uploader_id': ObjectId(),
+        'created_at': datetime.utcnow()
+    })
+    
+    result = app.test_cli_runner().invoke(args=['db', 'migrate-images'])
+    assert result.exit_code == 0, result.output
+    assert db.images.find_one()['ref_count'] == 0
@@ -0,0 +1,21 @@
+import pytest
+from query_plans import hot_loaders, check_query_plans
+
+pytestmark = pytest.mark.mongo
+
+LOADERS = dict(hot_loaders())
+
+def _describe(command):
+    name = next(iter(command))
+    shape = command.get('filter', command.get('query', command.get('pipeline')))
+    return f"{name} {command[name]} {shape}"
+
+@pytest.mark.parametrize('name', list(LOADERS))
+def test_hot_loader_plans_use_indexes(app, name):
+    """Every query a hot loader sends plans without a COLLSCAN or in-memory SORT"""
+    with app.app_context():
+        results = check_query_plans(app, LOADERS[name])
+    
+    assert results, f"{name} sent no queries"
+    failures = [f"{_describe(command)}: {', '.join(problems)}" for command, problems in results if problems]
+    assert not failures, '\n'.join(failures)
@@ -0,0 +1,153 @@
+import json
+import threading
+import pytest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+pytestmark = pytest.mark.mongo
+
+class StandIn:
+    """Local HTTP stand-in for n8n answering with the queued statuses, then 200"""
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.received = []
+        stand_in = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stand_in.received.append(json.loads(body))
+                self.send_response(stand_in.statuses.pop(0) if stand_in.statuses else 200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/webhook'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stand_in():
+    servers = []
+    
+    def start(*statuses):
+        server = StandIn(*statuses)
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.close()
+
+@pytest.fixture
+def queue_event(app, db):
+    from utils.webhook import send_webhook
+    
+    def queue(event_type='campaign_created', data=None):
+        with app.test_request_context():
+            app.config['N8N_WEBHOOK_URL'] = 'http://127.0.0.1:9/unused'
+            assert send_webhook(event_type, data or {'campaign_id': 'c1'})
+        return db.webhook_outbox.find_one(sort=[('_id', -1)])
+    return queue
+
+def dispatcher_for(app, url, **config):
+    from utils.webhook_dispatcher import WebhookDispatcher
+    
+    dispatcher = WebhookDispatcher(app, url=url)
+    dispatcher.batching = {}
+    dispatcher.__dict__.update(config)
+    return dispatcher
+
+def make_due(db, doc_id):
+    db.webhook_outbox.update_one({'_id': doc_id}, {'$set': {'next_attempt_at': datetime.utcnow()}})
+
+def counters(event_type):
+    from utils.webhook_dispatcher import metrics
+    return dict(metrics.snapshot().get(event_type, {}))
+
+def test_failed_delivery_is_retried_after_backoff_then_sent(app, db, stand_in, queue_event):
+    server = stand_in(500)
+    doc = queue_event()
+    dispatcher = dispatcher_for(app, server.url, backoff_base=2)
+    before = counters('campaign_created')
+    
+    started = datetime.utcnow()
+    assert dispatcher.run_once()
+    retried = db.webhook_outbox.find_one({'_id': doc['_id']})
+    assert retried['status'] == 'pending'
+    assert retried['attempts'] == 1
+    assert retried['last_error'] == 'status 500'
+    assert retried['next_attempt_at'] >= started + timedelta(seconds=2)
+    
+    # Not due yet: the outbox looks idle until the backoff passes
+    assert not dispatcher.run_once()
+    make_due(db, doc['_id'])
+    assert dispatcher.run_once()
+    
+    sent = db.webhook_outbox.find_one({'_id': doc['_id']})
+    assert sent['status'] == 'sent'
+    assert sent['attempts'] == 2
+    assert len(server.received) == 2
+    assert server.received[-1]['event_type'] == 'campaign_created'
+    
+    after = counters('campaign_created')
+    assert after.get('retried', 0) - before.get('retried', 0) == 1
+    assert after.get('sent', 0) - before.get('sent', 0) == 1
+
+def test_backoff_doubles_until_the_event_is_dead_lettered(app, db, stand_in, queue_event):
+    server = stand_in(500, 500, 500)
+    doc = queue_event()
+    dispatcher = dispatcher_for(app, server.url, backoff_base=2, max_attempts=3)
+    before = counters('campaign_created')
+    
+    delays = []
+    for _ in range(2):
+        started = datetime.utcnow()
+        assert dispatcher.run_once()
+        retried = db.webhook_outbox.find_one({'_id': doc['_id']})
+        delays.append((retried['next_attempt_at'] - started).total_seconds())
+        make_due(db, doc['_id'])
+    assert 2 <= delays[0] < 3
+    assert 4 <= delays[1] < 5
+    
+    assert dispatcher.run_once()
+    dead = db.webhook_outbox.find_one({'_id': doc['_id']})
+    assert dead['status'] == 'dead'
+    assert dead['attempts'] == 3
+    
+    # Dead letters are never claimed again
+    make_due(db, doc['_id'])
+    assert not dispatcher.run_once()
+    assert len(server.received) == 3
+    
+    after = counters('campaign_created')
+    assert after.get('dead', 0) - before.get('dead', 0) == 1
+    assert after.get('retried', 0) - before.get('retried', 0) == 2
+
+def test_delivery_after_lease_expiry_does_not_overwrite_the_new_claim(app, db, stand_in, queue_event):
+    server = stand_in()
+    doc = queue_event()
+    slow = dispatcher_for(app, server.url)
+    fast = dispatcher_for(app, server.url)
+    
+    claimed = slow.claim()
+    # The lease runs out while slow is still delivering, and fast claims it
+    make_due(db, doc['_id'])
+    reclaimed = fast.claim()
+    assert reclaimed['lease_id'] != claimed['lease_id']
+    
+    slow.deliver(claimed)
+    current = db.webhook_outbox.find_one({'_id': doc['_id']})
+    assert current['status'] == 'sending'
+    assert current['lease_id'] == reclaimed['lease_id']
+    
+    slow.fail(claimed, 'late failure')
+    assert 'last_error' not in db.webhook_outbox.find_one({'_id': doc['_id']})
+    
+    fast.deliver(reclaimed)
+    assert db.webhook_outbox.find_one({'_id': doc['_id']})['status'] == 'sent'
@@ -13,11 +13,16 @@ from .helpers import (
     format_date,
     calculate_days_ago,
     resize_image,
+    resize_image_bytes,
     generate_receipt_id,
     sanitize_filename,
     calculate_progress_percentage,
     truncate_text,
     format_large_number,
+    resolve_projection,
+    encode_cursor,
+    decode_cursor,
+    keyset_paginate,
     Pagination
 )
 
@@ -31,10 +36,15 @@ __all__ = [
     'format_date',
     'calculate_days_ago',
     'resize_image',
+    'resize_image_bytes',
     'generate_receipt_id',
     'sanitize_filename',
     'calculate_progress_percentage',
     'truncate_text',
     'format_large_number',
+    'resolve_projection',
+    'encode_cursor',
+    'decode_cursor',
+    'keyset_paginate',
     'Pagination'
 ]
@@ -0,0 +1,116 @@
+import gzip
+import time
+import zlib
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # gzip only without it
+    brotli = None
+
+# Response compression for dynamic pages, run from create_app's after_request.
+# Buffered responses (rendered pages, JSON) are compressed in one go once they
+# pass COMPRESS_MIN_SIZE; streamed ones (the admin exports) are wrapped in an
+# incremental compressor so each chunk is still sent as it is produced.
+# File responses (direct_passthrough: images, the precompressed assets) and
+# anything already encoded are left alone.
+
+def choose_encoding():
+    """Best encoding the client accepts that this worker can produce"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def _compressor(encoding, config):
+    # Both return (process, finish) so the streaming path can treat them alike
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config.get('COMPRESS_BR_QUALITY', 4))
+        return compressor.process, compressor.finish
+    # wbits 31: deflate with a gzip header and trailer
+    compressor = zlib.compressobj(config.get('COMPRESS_LEVEL', 6), zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+def compress(data, encoding, config):
+    process, finish = _compressor(encoding, config)
+    return process(data) + finish()
+
+def _stream(response, encoding, config):
+    original = response.response
+    chunks = response.iter_encoded()
+    process, finish = _compressor(encoding, config)
+    
+    def generate():
+        try:
+            for chunk in chunks:
+                data = process(chunk)
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            close = getattr(original, 'close', None)
+            if close is not None:
+                close()
+    return generate()
+
+def compress_response(response):
+    """Compress response in place for the current request if it is worth it"""
+    config = current_app.config
+    if not config.get('COMPRESS_ENABLED', True):
+        return response
+    if response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if 'Content-Encoding' in response.headers or 'no-transform' in response.headers.get('Cache-Control', ''):
+        return response
+    if response.mimetype not in config.get('COMPRESS_MIMETYPES', ()):
+        return response
+    
+    # The body now depends on the header even when this client gets it plain
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+    
+    if response.is_streamed:
+        response.response = _stream(response, encoding, config)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        compressed = compress(data, encoding, config)
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+    
+    response.headers['Content-Encoding'] = encoding
+    # The encoded body is not byte-identical to the one the ETag was made for
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def benchmark(body, gzip_levels=(1, 6, 9), br_qualities=(1, 4, 11), rounds=20):
+    """Compressed size and mean CPU milliseconds for body at each level"""
+    results = []
+    encoders = [('gzip', level, lambda data, level=level: gzip.compress(data, compresslevel=level))
+                for level in gzip_levels]
+    if brotli is not None:
+        encoders += [('br', quality, lambda data, quality=quality: brotli.compress(data, quality=quality))
+                     for quality in br_qualities]
+    
+    for encoding, level, encode in encoders:
+        started = time.process_time()
+        for _ in range(rounds):
+            size = len(encode(body))
+        elapsed = (time.process_time() - started) / rounds
+        results.append({
+            'encoding': encoding,
+            'level': level,
+            'size': size,
+            'saved': 1 - size / len(body) if body else 0,
+            'ms': elapsed * 1000
+        })
+    return results
@@ -0,0 +1,62 @@
+import hashlib
+import os
+from flask import current_app, request, session
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+# Conditional GET for rendered pages. A route builds its ETag from the version
+# counters of the documents the page shows (cheap projected reads), and
+# not_modified() answers a matching If-None-Match / If-Modified-Since with 304
+# before any template is rendered. The ETag also covers the viewer (the navbar
+# is per user) and the template sources, so a deploy or a login is never
+# answered with a stale page.
+
+_template_fingerprint = None
+
+def template_fingerprint():
+    """Short hash of every template file, computed once per worker"""
+    global _template_fingerprint
+    if _template_fingerprint is None:
+        digest = hashlib.sha1()
+        root = os.path.join(current_app.root_path, current_app.template_folder)
+        for folder, _, files in sorted(os.walk(root)):
+            for name in sorted(files):
+                with open(os.path.join(folder, name), 'rb') as f:
+                    digest.update(f.read())
+        _template_fingerprint = digest.hexdigest()[:8]
+    return _template_fingerprint
+
+def page_etag(*parts):
+    """ETag for a page built from parts plus the viewer and the template fingerprint"""
+    # The viewer's version moves on every profile edit, e.g. the name in the navbar
+    viewer = f"{current_user.get_id()}.{version(current_user)}" if current_user.is_authenticated else 'anon'
+    return '-'.join(str(part) for part in (template_fingerprint(), viewer) + parts)
+
+def not_modified(etag, last_modified=None):
+    """A 304 response if the client's copy is current, otherwise None"""
+    # A pending flash message is part of the page the client has not seen yet
+    if session.get('_flashes'):
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    
+    response = current_app.response_class(status=304)
+    return with_validators(response, etag, last_modified)
+
+def with_validators(response, etag, last_modified=None):
+    """Attach ETag / Last-Modified and a private, always-revalidate Cache-Control"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def last_modified(*docs):
+    """Latest updated_at (or created_at, for documents written before versioning) of docs"""
+    times = [getattr(doc, 'updated_at', None) or getattr(doc, 'created_at', None) for doc in docs if doc]
+    times = [t for t in times if t is not None]
+    return max(times) if times else None
+
+def version(doc):
+    return getattr(doc, 'version', 0) if doc else 'none'
@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+from datetime import datetime
+from bson.objectid import ObjectId
+
+# data_type -> collection, exported fields and the field an organisation
+# filter applies to. password_hash and image payloads are never exported.
+EXPORTS = {
+    'users': {
+        'collection': 'users',
+        'fields': ('_id', 'username', 'email', 'phone', 'user_type', 'is_active', 'created_at'),
+        'organisation_field': None,
+    },
+    'organisations': {
+        'collection': 'organisations',
+        'fields': ('_id', 'name', 'user_id', 'is_verified', 'total_donations', 'website', 'phone',
+                   'address', 'registration_number', 'created_at'),
+        'organisation_field': '_id',
+    },
+    'campaigns': {
+        'collection': 'campaigns',
+        'fields': ('_id', 'title', 'organisation_id', 'category', 'goal_amount', 'raised_amount',
+                   'is_active', 'end_date', 'created_at'),
+        'organisation_field': 'organisation_id',
+    },
+    'donations': {
+        'collection': 'donations',
+        'fields': ('_id', 'amount', 'donor_id', 'campaign_id', 'organisation_id', 'payment_status',
+                   'transaction_id', 'receipt_id', 'is_anonymous', 'created_at', 'completed_at'),
+        'organisation_field': 'organisation_id',
+    },
+}
+EXPORTS['organizations'] = EXPORTS['organisations']
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+class ExportError(ValueError):
+    """Raised for an export request that cannot be served"""
+
+def export_query(data_type, start=None, end=None, organisation_id=None):
+    """Build (collection name, filter, fields) for an export.
+    
+    The filters only touch fields that lead an index on the collection
+    (created_at ranges, organisation_id equality), so the cursor is an
+    index scan rather than a filtered collection scan.
+    """
+    spec = EXPORTS.get(data_type)
+    if spec is None:
+        raise ExportError(f"Unknown export type: {data_type}")
+    
+    query = {}
+    if start or end:
+        query['created_at'] = {}
+        if start:
+            query['created_at']['$gte'] = start
+        if end:
+            query['created_at']['$lt'] = end
+    if organisation_id:
+        if spec['organisation_field'] is None:
+            raise ExportError(f"{data_type} cannot be filtered by organisation")
+        try:
+            query[spec['organisation_field']] = ObjectId(organisation_id)
+        except Exception:
+            raise ExportError('Invalid organisation id')
+    return spec['collection'], query, spec['fields']
+
+def _value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def iter_csv(cursor, fields, rows_per_chunk=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for count, doc in enumerate(cursor, 1):
+        writer.writerow([_value(doc.get(field)) for field in fields])
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_ndjson(cursor, fields, rows_per_chunk=500):
+    lines = []
+    for doc in cursor:
+        lines.append(json.dumps({field: _value(doc.get(field)) for field in fields}))
+        if len(lines) >= rows_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last drain"""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self._position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_parquet(cursor, fields, rows_per_chunk=10000):
+    """One Parquet row group per rows_per_chunk documents; needs pyarrow"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError('Parquet export requires pyarrow')
+    
+    # Values are stringified except numbers and booleans, so the schema is
+    # stable across row groups even when a field is missing from some rows
+    def column_value(value):
+        value = _value(value)
+        return value if value is None or isinstance(value, str) else str(value)
+    
+    numeric = {'amount', 'goal_amount', 'raised_amount', 'total_donations'}
+    boolean = {'is_active', 'is_verified', 'is_anonymous'}
+    schema = pa.schema([
+        (field, pa.float64() if field in numeric else pa.bool_() if field in boolean else pa.string())
+        for field in fields
+    ])
+    
+    def generate():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema)
+        columns = {field: [] for field in fields}
+        rows = 0
+        for doc in cursor:
+            for field in fields:
+                value = doc.get(field)
+                if field in numeric:
+                    columns[field].append(None if value is None else float(value))
+                elif field in boolean:
+                    columns[field].append(None if value is None else bool(value))
+                else:
+                    columns[field].append(column_value(value))
+            rows += 1
+            if rows >= rows_per_chunk:
+                writer.write_table(pa.table(columns, schema=schema))
+                columns = {field: [] for field in fields}
+                rows = 0
+                yield sink.drain()
+        if rows:
+            writer.write_table(pa.table(columns, schema=schema))
+        writer.close()
+        yield sink.drain()
+    
+    return generate()
+
+SERIALIZERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+    'parquet': iter_parquet,
+}
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, render_template, copy_current_request_context
+from markupsafe import Markup
+
+# Rendered HTML fragments, per worker. An entry is fresh for
+# FRAGMENT_CACHE_TTL seconds and may then be served stale for another
+# FRAGMENT_CACHE_STALE seconds while a single background thread re-renders it,
+# so a spike of requests never piles onto MongoDB at expiry. If re-rendering
+# fails (MongoDB slow or down) the old copy keeps being served. Writes to the
+# tagged collections drop the matching entries in the writing worker; other
+# workers catch up within the TTL.
+
+class FragmentCache:
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (html, fresh_until, stale_until, tags)
+        self._refreshing = set()
+        # Bumped per tag by invalidate() (and for everything by clear()), so a
+        # render only loses the race to writes that touch its own tags
+        self._generations = {}
+        self._epoch = 0
+    
+    def _generation(self, tags):
+        # Caller holds self._lock
+        return self._epoch, tuple(self._generations.get(tag, 0) for tag in tags)
+    
+    def get_or_render(self, key, render, ttl, stale_ttl, tags=()):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        
+        if entry is not None and now < entry[1]:
+            return entry[0]
+        if entry is not None and now < entry[2]:
+            self._refresh_in_background(key, render, ttl, stale_ttl, tags)
+            return entry[0]
+        
+        with self._lock:
+            generation = self._generation(tags)
+        try:
+            html = render()
+        except Exception:
+            if entry is None:
+                raise
+            current_app.logger.exception(f"Fragment {key} failed to render; serving expired copy")
+            return entry[0]
+        self._store(key, html, ttl, stale_ttl, tags, generation)
+        return html
+    
+    def _store(self, key, html, ttl, stale_ttl, tags, generation):
+        now = time.monotonic()
+        with self._lock:
+            # An invalidation while this was rendering may have made it stale already
+            if generation != self._generation(tags):
+                return
+            self._entries[key] = (html, now + ttl, now + ttl + stale_ttl, frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def _refresh_in_background(self, key, render, ttl, stale_ttl, tags):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            generation = self._generation(tags)
+        
+        app = current_app._get_current_object()
+        
+        @copy_current_request_context
+        def refresh():
+            try:
+                self._store(key, render(), ttl, stale_ttl, tags, generation)
+            except Exception:
+                app.logger.exception(f"Background refresh of fragment {key} failed")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        
+        threading.Thread(target=refresh, name='fragment-refresh', daemon=True).start()
+    
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in [key for key, entry in self._entries.items() if entry[3] & set(tags)]:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+fragments = FragmentCache()
+
+def cached_fragment(template, load, tags=(), ttl=None, **params):
+    """Render template with load(**params) as its context, through the fragment cache.
+    
+    The key is the template plus params, so params must be everything the
+    fragment depends on. Returns Markup ready to drop into a page.
+    """
+    config = current_app.config
+    key = (template, tuple(sorted(params.items())))
+    
+    def render():
+        return Markup(render_template(template, **load(**params)))
+    
+    return fragments.get_or_render(
+        key,
+        render,
+        config.get('FRAGMENT_CACHE_TTL', 60) if ttl is None else ttl,
+        config.get('FRAGMENT_CACHE_STALE', 600),
+        tags
+    )
+
+def invalidate_fragments(*tags):
+    fragments.invalidate(*tags)
@@ -2,8 +2,10 @@ from functools import wraps
 from flask import redirect, url_for, flash
 from flask_login import current_user
 import re
+import json
 from datetime import datetime
 import base64
+from bson.objectid import ObjectId
 from io import BytesIO
 from PIL import Image
 
@@ -59,22 +61,29 @@ def resize_image(image_data, max_width=800, max_height=600, quality=85):
     try:
         # Decode base64 image
         image_bytes = base64.b64decode(image_data)
-        image = Image.open(BytesIO(image_bytes))
-        
-        # Calculate new dimensions
-        image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-        
-        # Save as JPEG with specified quality
-        output = BytesIO()
-        if image.mode in ('RGBA', 'LA', 'P'):
-            image = image.convert('RGB')
-        image.save(output, format='JPEG', quality=quality)
+        resized = resize_image_bytes(image_bytes, max_width, max_height, quality=quality)
         
         # Return base64 encoded resized image
-        return base64.b64encode(output.getvalue()).decode('utf-8')
+        return base64.b64encode(resized).decode('utf-8')
     except Exception as e:
         return image_data  # Return original if resize fails
 
+def resize_image_bytes(image_bytes, max_width=800, max_height=600, format='JPEG', quality=85):
+    """Resize raw image bytes while maintaining aspect ratio, returning encoded bytes"""
+    image = Image.open(BytesIO(image_bytes))
+    
+    # Calculate new dimensions
+    image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+    
+    # JPEG has no alpha channel; PNG and WebP keep it
+    output = BytesIO()
+    if format == 'JPEG' and image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGB')
+    elif image.mode == 'P':
+        image = image.convert('RGBA')
+    image.save(output, format=format, quality=quality)
+    return output.getvalue()
+
 def generate_receipt_id():
     """Generate unique receipt ID"""
     timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
@@ -112,11 +121,18 @@ def format_large_number(number):
         return str(int(number))
 
 class Pagination:
-    """Simple pagination helper"""
-    def __init__(self, page, per_page, total_count):
+    """Simple pagination helper
+    
+    Offset pages know their total_count. Keyset pages (see keyset_paginate)
+    leave it as None and carry opaque next/prev cursor tokens instead.
+    """
+    def __init__(self, page, per_page, total_count, next_cursor=None, prev_cursor=None, rows=None):
         self.page = page
         self.per_page = per_page
         self.total_count = total_count
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.rows = rows if rows is not None else []
     
     @property
     def items(self):
@@ -132,10 +148,14 @@ class Pagination:
     
     @property
     def has_prev(self):
+        if self.total_count is None:
+            return self.prev_cursor is not None
         return self.page > 1
     
     @property
     def has_next(self):
+        if self.total_count is None:
+            return self.next_cursor is not None
         return self.page < self.pages
     
     @property
@@ -149,3 +169,99 @@ class Pagination:
                (self.page - left_current - 1 < num < self.page + right_current) or \
                num > last - right_edge:
                 yield num
+
+def resolve_projection(profiles, projection):
+    """Turn a named projection profile ('card', 'row', 'detail') into a find() projection.
+    
+    Profiles are tuples of field names; None (or 'detail') means the whole
+    document. A dict is passed through unchanged.
+    """
+    if isinstance(projection, str):
+        projection = profiles[projection]
+    if projection is None or isinstance(projection, dict):
+        return projection
+    return {field: 1 for field in projection}
+
+def encode_cursor(doc, direction='next'):
+    """Opaque token for the (created_at, _id) position of doc"""
+    position = {'t': doc['created_at'].isoformat(), 'i': str(doc['_id']), 'd': direction}
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+def decode_cursor(token):
+    """Return (created_at, _id, direction) for a token, or None if it is not valid"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        direction = position['d'] if position['d'] in ('next', 'prev') else 'next'
+        return datetime.fromisoformat(position['t']), ObjectId(position['i']), direction
+    except Exception:
+        return None
+
+def keyset_paginate(collection, query, cursor=None, per_page=20, projection=None, wrap=None, join=None):
+    """Newest-first page of collection keyed on (created_at, _id).
+    
+    Each page costs one indexed range scan of per_page + 1 documents no
+    matter how deep it is, which needs an index ending in
+    (created_at: -1, _id: -1) behind the query's equality fields.
+    join is a list of aggregation stages (usually $lookup) applied to the
+    page after it has been cut, so the whole page is one round trip.
+    Returns a Pagination whose rows are the documents, passed through wrap
+    when given.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    direction = position[2] if position else 'next'
+    
+    if position:
+        created_at, _id, _ = position
+        op, bound = ('$lt', '$lte') if direction == 'next' else ('$gt', '$gte')
+        # The created_at bound becomes the index range; the $or only breaks ties
+        query = {'$and': [
+            query,
+            {'created_at': {bound: created_at}},
+            {'$or': [{'created_at': {op: created_at}}, {'_id': {op: _id}}]}
+        ]}
+    
+    order = -1 if direction == 'next' else 1
+    sort = [('created_at', order), ('_id', order)]
+    if join:
+        pipeline = [{'$match': query}, {'$sort': dict(sort)}, {'$limit': per_page + 1}]
+        if projection:
+            pipeline.append({'$project': projection})
+        docs = list(collection.aggregate(pipeline + list(join)))
+    else:
+        docs = list(collection.find(query, projection).sort(sort).limit(per_page + 1))
+    more = len(docs) > per_page
+    docs = docs[:per_page]
+    
+    if direction == 'next':
+        next_cursor = encode_cursor(docs[-1], 'next') if more else None
+        prev_cursor = encode_cursor(docs[0], 'prev') if position and docs else None
+    else:
+        docs.reverse()
+        prev_cursor = encode_cursor(docs[0], 'prev') if more else None
+        next_cursor = encode_cursor(docs[-1], 'next') if docs else None
+    
+    rows = [wrap(doc) for doc in docs] if wrap else docs
+    return Pagination(None, per_page, None, next_cursor=next_cursor, prev_cursor=prev_cursor, rows=rows)
+
+_transactions_supported = None
+
+def transactions_supported(app):
+    """Whether app's MongoDB deployment can run multi-document transactions.
+    
+    MONGO_TRANSACTIONS forces the answer either way; left unset, the server is
+    asked once per process: replica set members and mongos routers support
+    them, standalone servers do not.
+    """
+    global _transactions_supported
+    override = app.config.get('MONGO_TRANSACTIONS')
+    if override is not None:
+        return override
+    if _transactions_supported is None:
+        from extensions import mongo
+        
+        try:
+            hello = mongo.cx.admin.command('hello')
+        except Exception:
+            return False
+        _transactions_supported = 'setName' in hello or hello.get('msg') == 'isdbgrid'
+    return _transactions_supported
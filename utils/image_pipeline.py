@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from flask import current_app
+from io import BytesIO
+
+# Derivatives are generated on a small shared pool after the upload request
+# has returned. The semaphore bounds the backlog; uploads that arrive while it
+# is full keep serving their original until `flask db generate-image-variants`
+# fills the gap.
+_executor = None
+_slots = None
+_lock = Lock()
+
+def _get_executor(app):
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = app.config.get('IMAGE_VARIANT_WORKERS', 2)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-variants')
+            _slots = BoundedSemaphore(app.config.get('IMAGE_VARIANT_QUEUE', 32))
+    return _executor
+
+def schedule_variants(image_id):
+    """Queue derivative generation for an image; returns False if the pool is saturated"""
+    app = current_app._get_current_object()
+    executor = _get_executor(app)
+    if not _slots.acquire(blocking=False):
+        app.logger.warning(f"Image variant queue full, skipping {image_id}")
+        return False
+    executor.submit(_run, app, image_id)
+    return True
+
+def _run(app, image_id):
+    try:
+        with app.app_context():
+            generate_variants(image_id)
+    except Exception as e:
+        app.logger.error(f"Image variant generation failed for {image_id}: {str(e)}")
+    finally:
+        _slots.release()
+
+def generate_variants(image_id):
+    """Render every Image.SIZES width, in the original format and as WebP"""
+    from models.image import Image, get_bucket, store_stream
+    from utils.helpers import resize_image_bytes
+    
+    image = Image.get_metadata(image_id)
+    if not image or image.file_id is None:
+        return None
+    
+    grid_out = get_bucket().open_download_stream(image.file_id)
+    try:
+        original = grid_out.read()
+    finally:
+        grid_out.close()
+    
+    # Keep transparency for formats that can carry it
+    if image.content_type in ('image/png', 'image/gif'):
+        base_format, base_type = 'PNG', 'image/png'
+    else:
+        base_format, base_type = 'JPEG', 'image/jpeg'
+    
+    variants = {}
+    for width in Image.SIZES:
+        for webp, format, content_type in (
+            (False, base_format, base_type),
+            (True, 'WEBP', 'image/webp'),
+        ):
+            key = Image.variant_key(width, webp)
+            # Bound by width only; tall images still fill object-fit: cover slots
+            data = resize_image_bytes(original, width, width * 4, format=format)
+            file_id, length, _ = store_stream(BytesIO(data), f"{image.filename}@{key}", content_type)
+            variants[key] = {'content_type': content_type, 'file_id': file_id, 'length': length}
+    
+    return image.set_variants(variants)
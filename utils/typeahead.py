@@ -0,0 +1,165 @@
+import bisect
+import os
+import re
+import threading
+import time
+import pymongo
+
+# Prefix index over verified organisation names and active campaign titles.
+# Every word of a name is a key, so "wat" finds "Clean Water Fund". Keys live
+# in one sorted list of (key, kind, id) and a prefix query is a bisect plus a
+# short forward scan, so suggestions never touch MongoDB. create_app builds
+# it at startup; a worker forked from that process keeps the copy it
+# inherited, so no request waits for a build unless the startup one failed.
+# A copy older than TYPEAHEAD_REFRESH seconds is rebuilt in a background
+# thread, while requests keep reading it, to pick up changes made by other
+# workers; saves in this worker apply at once.
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+def _keys(label):
+    words = _WORD.findall(label.lower())
+    # The whole label plus every word suffix: 'clean water fund', 'water fund', 'fund'
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+class TypeaheadIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []  # sorted (key, kind, id)
+        self._labels = {}  # (kind, id) -> label
+        self.built_at = None
+        self.pid = None
+    
+    def build(self, entries):
+        """Replace the index with (kind, id, label) entries"""
+        keys, labels = [], {}
+        for kind, _id, label in entries:
+            if label:
+                labels[(kind, _id)] = label
+                keys.extend((key, kind, _id) for key in _keys(label))
+        keys.sort()
+        with self._lock:
+            self._keys, self._labels = keys, labels
+            self.built_at = time.monotonic()
+            self.pid = os.getpid()
+    
+    def add(self, kind, _id, label):
+        with self._lock:
+            self._remove(kind, _id)
+            if not label:
+                return
+            self._labels[(kind, _id)] = label
+            for key in _keys(label):
+                bisect.insort(self._keys, (key, kind, _id))
+    
+    def remove(self, kind, _id):
+        with self._lock:
+            self._remove(kind, _id)
+    
+    def _remove(self, kind, _id):
+        label = self._labels.pop((kind, _id), None)
+        if label is None:
+            return
+        for key in _keys(label):
+            i = bisect.bisect_left(self._keys, (key, kind, _id))
+            if i < len(self._keys) and self._keys[i] == (key, kind, _id):
+                del self._keys[i]
+    
+    def suggest(self, prefix, limit=8):
+        """Up to limit (kind, id, label) whose label has a word starting with prefix"""
+        prefix = ' '.join(_WORD.findall(prefix.lower()))
+        if not prefix:
+            return []
+        
+        results, seen = [], set()
+        with self._lock:
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                key, kind, _id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if (kind, _id) not in seen:
+                    seen.add((kind, _id))
+                    results.append((kind, _id, self._labels[(kind, _id)]))
+                i += 1
+        return results
+    
+    def __len__(self):
+        return len(self._labels)
+
+index = TypeaheadIndex()
+_build_lock = threading.Lock()
+
+def _load():
+    from extensions import mongo
+    
+    for org in mongo.db.organisations.find({'is_verified': True}, {'name': 1}):
+        yield 'organisation', str(org['_id']), org.get('name')
+    for campaign in mongo.db.campaigns.find({'is_active': True}, {'title': 1}):
+        yield 'campaign', str(campaign['_id']), campaign.get('title')
+
+def build_index(app):
+    """Build this process's index at startup; a database that is down only
+    defers the build to the first suggestion request"""
+    try:
+        # Bounded so an unreachable server does not stall startup for the full selection timeout
+        with app.app_context(), pymongo.timeout(5):
+            index.build(_load())
+    except Exception as e:
+        app.logger.warning(f"Typeahead index not built at startup, building on first use: {e}")
+
+def _after_fork():
+    global _build_lock
+    # The inherited copy is as fresh as it was in the parent; a refresh the
+    # parent had in flight did not come along, so neither does its lock
+    _build_lock = threading.Lock()
+    if index.pid is not None:
+        index.pid = os.getpid()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def get_index(app):
+    """This worker's index: built here only if startup could not, and
+    refreshed in the background once older than TYPEAHEAD_REFRESH"""
+    if index.pid != os.getpid():
+        with _build_lock:
+            if index.pid != os.getpid():
+                index.build(_load())
+    elif time.monotonic() - index.built_at >= app.config.get('TYPEAHEAD_REFRESH', 300):
+        _refresh_in_background(app)
+    return index
+
+def _refresh_in_background(app):
+    lock = _build_lock
+    if not lock.acquire(blocking=False):
+        return
+    
+    def refresh():
+        try:
+            with app.app_context():
+                index.build(_load())
+        except Exception:
+            app.logger.exception("Background refresh of the typeahead index failed")
+        finally:
+            lock.release()
+    
+    threading.Thread(target=refresh, name='typeahead-refresh', daemon=True).start()
+
+def _ready():
+    return index.pid == os.getpid()
+
+def index_organisation(org):
+    """Apply a saved organisation to this worker's index"""
+    if _ready():
+        if getattr(org, 'is_verified', False):
+            index.add('organisation', str(org._id), getattr(org, 'name', None))
+        else:
+            index.remove('organisation', str(org._id))
+
+def index_campaign(campaign):
+    """Apply a saved campaign to this worker's index"""
+    if _ready():
+        if getattr(campaign, 'is_active', False):
+            index.add('campaign', str(campaign._id), getattr(campaign, 'title', None))
+        else:
+            index.remove('campaign', str(campaign._id))
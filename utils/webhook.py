@@ -1,18 +1,21 @@
-import requests
-import json
 from flask import current_app
 from datetime import datetime
+from extensions import mongo
 
 def send_webhook(event_type, data):
     """
-    Send webhook to n8n for processing
+    Queue a webhook to n8n for processing
+    
+    The event is appended to the webhook_outbox collection and delivered by
+    the background dispatcher (utils.webhook_dispatcher), which retries with
+    exponential backoff and dead-letters events that keep failing.
     
     Args:
         event_type (str): Type of event (e.g., 'user_registration', 'donation_completed')
         data (dict): Event data to send
     
     Returns:
-        bool: True if webhook sent successfully, False otherwise
+        bool: True if webhook queued successfully, False otherwise
     """
     try:
         webhook_url = current_app.config.get('N8N_WEBHOOK_URL')
@@ -20,34 +23,26 @@ def send_webhook(event_type, data):
             current_app.logger.warning("N8N_WEBHOOK_URL not configured")
             return False
         
+        now = datetime.utcnow()
         payload = {
             'event_type': event_type,
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': now.isoformat(),
             'data': data
         }
         
-        headers = {
-            'Content-Type': 'application/json',
-            'User-Agent': 'DonationPlatform/1.0'
-        }
+        mongo.db.webhook_outbox.insert_one({
+            'event_type': event_type,
+            'payload': payload,
+            'status': 'pending',
+            'attempts': 0,
+            'created_at': now,
+            'next_attempt_at': now
+        })
         
-        response = requests.post(
-            webhook_url,
-            data=json.dumps(payload),
-            headers=headers,
-            timeout=10
-        )
+        from utils.webhook_dispatcher import ensure_dispatcher
+        ensure_dispatcher(current_app._get_current_object())
+        return True
         
-        if response.status_code == 200:
-            current_app.logger.info(f"Webhook sent successfully for event: {event_type}")
-            return True
-        else:
-            current_app.logger.error(f"Webhook failed with status {response.status_code}")
-            return False
-            
-    except requests.exceptions.RequestException as e:
-        current_app.logger.error(f"Webhook request failed: {str(e)}")
-        return False
     except Exception as e:
         current_app.logger.error(f"Webhook error: {str(e)}")
         return False
@@ -0,0 +1,275 @@
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+from extensions import mongo
+
+# Outbox document lifecycle:
+#   pending -> sending -> sent
+#                      -> pending (retry, with next_attempt_at pushed back)
+#                      -> dead    (after WEBHOOK_MAX_ATTEMPTS)
+# A claimed document's next_attempt_at doubles as its lease: if the worker
+# dies mid-delivery the document becomes claimable again once it passes.
+# Each claim stamps a fresh lease_id, and the sent / retry / dead updates only
+# apply while it is still ours, so a delivery that outlived its lease never
+# overwrites a document another worker has since claimed.
+#
+# Event types listed in WEBHOOK_BATCHING are delivered in groups instead: a
+# batch is flushed once max_size events are due or the oldest has waited
+# max_latency seconds, and goes out as one gzip-compressed POST of
+# {"event_type": "webhook_batch", "batch_event_type": ..., "events": [...]}.
+BATCH_EVENT_TYPE = 'webhook_batch'
+
+OUTBOX_INDEXES = [
+    IndexModel([('status', ASCENDING), ('next_attempt_at', ASCENDING)]),
+    IndexModel([('event_type', ASCENDING), ('status', ASCENDING), ('next_attempt_at', ASCENDING)]),
+    # Delivered events are only kept around for a week of debugging
+    IndexModel('sent_at', expireAfterSeconds=7 * 24 * 3600),
+]
+
+class WebhookMetrics:
+    """Per-event-type delivery counters for this process"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._latency = defaultdict(float)
+    
+    def record(self, event_type, outcome, count=1, latency=None):
+        with self._lock:
+            self._counters[event_type][outcome] += count
+            if latency is not None:
+                self._latency[event_type] += latency
+    
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for event_type, counters in self._counters.items():
+                snapshot[event_type] = dict(counters)
+                if counters.get('sent'):
+                    snapshot[event_type]['avg_latency_ms'] = round(
+                        self._latency[event_type] / counters['sent'] * 1000, 1
+                    )
+            return snapshot
+
+metrics = WebhookMetrics()
+
+class WebhookDispatcher:
+    """Drains the webhook_outbox collection on a small pool of threads"""
+    def __init__(self, app, url=None, workers=None, session=None):
+        self.app = app
+        self.url = url or app.config.get('N8N_WEBHOOK_URL')
+        self.workers = workers or app.config.get('WEBHOOK_DISPATCHER_WORKERS', 2)
+        self.timeout = app.config.get('WEBHOOK_TIMEOUT', 10)
+        self.max_attempts = app.config.get('WEBHOOK_MAX_ATTEMPTS', 8)
+        self.backoff_base = app.config.get('WEBHOOK_BACKOFF_BASE', 2)
+        self.backoff_max = app.config.get('WEBHOOK_BACKOFF_MAX', 3600)
+        self.poll_interval = app.config.get('WEBHOOK_POLL_INTERVAL', 1.0)
+        self.batching = app.config.get('WEBHOOK_BATCHING') or {}
+        self.session = session or self._build_session()
+        self._stop = threading.Event()
+        self._threads = []
+    
+    def _build_session(self):
+        # One keep-alive pool shared by all worker threads; retries are ours
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'Content-Type': 'application/json',
+            'User-Agent': 'DonationPlatform/1.0'
+        })
+        return session
+    
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'webhook-dispatcher-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+    
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+    
+    def _work(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    delivered = self.run_once()
+                except Exception as e:
+                    self.app.logger.error(f"Webhook dispatcher error: {str(e)}")
+                    delivered = False
+                if not delivered:
+                    self._stop.wait(self.poll_interval)
+    
+    def _due_query(self, now, event_type=None):
+        query = {'status': {'$in': ['pending', 'sending']}, 'next_attempt_at': {'$lte': now}}
+        if event_type is not None:
+            query['event_type'] = event_type
+        elif self.batching:
+            query['event_type'] = {'$nin': list(self.batching)}
+        return query
+    
+    def claim(self):
+        """Lease the oldest due outbox document of an unbatched event type"""
+        now = datetime.utcnow()
+        lease = timedelta(seconds=self.timeout * 3)
+        return mongo.db.webhook_outbox.find_one_and_update(
+            self._due_query(now),
+            {'$set': {'status': 'sending', 'next_attempt_at': now + lease, 'lease_id': ObjectId()}},
+            sort=[('next_attempt_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    def claim_batch(self, event_type):
+        """Lease up to max_size due events of a batched type once the batch is ready to flush"""
+        settings = self.batching[event_type]
+        max_size = settings.get('max_size', 100)
+        max_latency = timedelta(seconds=settings.get('max_latency', 5.0))
+        now = datetime.utcnow()
+        query = self._due_query(now, event_type)
+        
+        candidates = list(mongo.db.webhook_outbox.find(query, {'created_at': 1})
+                          .sort('next_attempt_at', ASCENDING)
+                          .limit(max_size))
+        if not candidates:
+            return []
+        if len(candidates) < max_size and min(c['created_at'] for c in candidates) > now - max_latency:
+            return []
+        
+        # Another worker may grab some of the same ids; we keep whatever we tagged
+        lease_id = ObjectId()
+        lease = timedelta(seconds=self.timeout * 3)
+        mongo.db.webhook_outbox.update_many(
+            dict(query, _id={'$in': [c['_id'] for c in candidates]}),
+            {'$set': {'status': 'sending', 'next_attempt_at': now + lease, 'lease_id': lease_id}}
+        )
+        return list(mongo.db.webhook_outbox.find({'lease_id': lease_id, 'status': 'sending'}))
+    
+    def run_once(self):
+        """Deliver one due event or batch; returns False when the outbox is idle"""
+        delivered = False
+        for event_type in self.batching:
+            docs = self.claim_batch(event_type)
+            if docs:
+                self.deliver_batch(event_type, docs)
+                delivered = True
+        
+        doc = self.claim()
+        if doc:
+            self.deliver(doc)
+            delivered = True
+        return delivered
+    
+    def post(self, body, headers=None):
+        """POST a serialized body; returns None on success or an error description"""
+        try:
+            response = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+            if response.status_code >= 300:
+                return f"status {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            return str(e)
+        return None
+    
+    def deliver_batch(self, event_type, docs):
+        started = time.monotonic()
+        body = gzip.compress(json.dumps({
+            'event_type': BATCH_EVENT_TYPE,
+            'batch_event_type': event_type,
+            'timestamp': datetime.utcnow().isoformat(),
+            'count': len(docs),
+            'events': [doc['payload'] for doc in docs]
+        }).encode('utf-8'))
+        error = self.post(body, headers={'Content-Encoding': 'gzip'})
+        
+        if error is None:
+            mongo.db.webhook_outbox.update_many(
+                {'_id': {'$in': [doc['_id'] for doc in docs]}, 'lease_id': docs[0]['lease_id'], 'status': 'sending'},
+                {'$set': {'status': 'sent', 'sent_at': datetime.utcnow()}, '$inc': {'attempts': 1}}
+            )
+            metrics.record(event_type, 'sent', count=len(docs), latency=(time.monotonic() - started) * len(docs))
+            metrics.record(event_type, 'batches')
+            return True
+        
+        for doc in docs:
+            self.fail(doc, error)
+        return False
+    
+    def deliver(self, doc):
+        event_type = doc['event_type']
+        started = time.monotonic()
+        error = self.post(json.dumps(doc['payload']))
+        
+        if error is None:
+            result = mongo.db.webhook_outbox.update_one(
+                self._leased(doc),
+                {'$set': {'status': 'sent', 'sent_at': datetime.utcnow()}, '$inc': {'attempts': 1}}
+            )
+            if not result.matched_count:
+                # Delivered anyway; the worker now holding it will send it again
+                self.app.logger.warning(f"Webhook {doc['_id']} ({event_type}) sent after its lease expired")
+            metrics.record(event_type, 'sent', latency=time.monotonic() - started)
+            return True
+        
+        self.fail(doc, error)
+        return False
+    
+    @staticmethod
+    def _leased(doc):
+        """Filter matching doc only while the lease it was claimed under still holds"""
+        return {'_id': doc['_id'], 'lease_id': doc['lease_id'], 'status': 'sending'}
+    
+    def backoff(self, attempts):
+        """Seconds to wait before retrying after the given number of failed attempts"""
+        return min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+    
+    def fail(self, doc, error):
+        attempts = doc.get('attempts', 0) + 1
+        event_type = doc['event_type']
+        update = {'attempts': attempts, 'last_error': error}
+        if attempts >= self.max_attempts:
+            update['status'] = 'dead'
+        else:
+            delay = self.backoff(attempts)
+            update['status'] = 'pending'
+            update['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=delay)
+        
+        result = mongo.db.webhook_outbox.update_one(self._leased(doc), {'$set': update})
+        if not result.matched_count:
+            self.app.logger.warning(f"Webhook {doc['_id']} ({event_type}) failed after its lease expired: {error}")
+            return
+        
+        if update['status'] == 'dead':
+            metrics.record(event_type, 'dead')
+            self.app.logger.error(f"Webhook {doc['_id']} ({event_type}) dead-lettered: {error}")
+        else:
+            metrics.record(event_type, 'retried')
+            self.app.logger.warning(f"Webhook {doc['_id']} ({event_type}) failed: {error}; retry in {delay}s")
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+
+def ensure_dispatcher(app):
+    """Start this process's dispatcher on first use (re-started after a fork)"""
+    global _dispatcher, _dispatcher_pid
+    if not app.config.get('WEBHOOK_DISPATCHER_ENABLED', True) or not app.config.get('N8N_WEBHOOK_URL'):
+        return None
+    if _dispatcher is not None and _dispatcher_pid == os.getpid():
+        return _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher_pid != os.getpid():
+            _dispatcher = WebhookDispatcher(app).start()
+            _dispatcher_pid = os.getpid()
+    return _dispatcher